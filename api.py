@@ -1,31 +1,139 @@
+import asyncio
+import hashlib
 import logging
 import os
-from datetime import date, datetime, timedelta
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from typing import Any
 
-from fastapi import FastAPI, HTTPException, Query, Request
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from pyutils.shortcuts import week_range_from_date, weeks_between
 from rgarmin import filters
+from rgarmin.async_client import AsyncGarminClient
+from rgarmin.cache import ResponseCache, SQLiteBackend
 from rgarmin.client import GarminClient
-from rgarmin.services import activities
+from rgarmin.pool import GarminClientPool
+from rgarmin.services import activities, load
+from rgarmin.services.refresh import RefreshScheduler
+from rgarmin.store import ActivityStore
+from rgarmin.types import to_json
 
 DEBUG = os.getenv("DEBUG", False)
+MAX_CONNECTIONS = 50
+MAX_DATE_RANGE = timedelta(weeks=8)
+MAX_LOAD_DATE_RANGE = timedelta(weeks=53)
+DEFAULT_LOAD_WEEKS = 12
+DEFAULT_ACCOUNT = "default"
+ACCOUNT_COOKIE = "rgarmin_account"
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+Account = tuple[AsyncGarminClient, ActivityStore, RefreshScheduler | None]
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    if garmin.client.has_account_data():
+        # the snapshot of the account is used right away and refreshed in the background
+        loading = asyncio.create_task(_refresh_account())
+    else:
+        loading = None
+        await garmin.load_account()
+    refresher.start()
+    pool.start()
+    yield
+    if loading is not None:
+        loading.cancel()
+    await refresher.stop()
+    await pool.close()
+    for account_store in stores.values():
+        account_store.close()
+    if cache_backend is not None:
+        cache_backend.close()
+
+
+async def _refresh_account():
+    try:
+        await garmin.load_account(refresh=True)
+    except Exception as e:
+        # the task is never awaited, anything it raises would only be reported when it is garbage collected
+        logger.error(f"Error refreshing the account data: {e}")
+
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 templates = Jinja2Templates(directory="templates")
 templates.env.filters["translate"] = filters.translate
 templates.env.filters["format_duration"] = filters.format_duration
+templates.env.filters["format_date"] = filters.format_date
+templates.env.filters["format_weekday"] = filters.format_weekday
 templates.env.filters["format_datetime"] = filters.format_datetime
 templates.env.filters["format_time"] = filters.format_time
 
-garmin = GarminClient()
+# responses are cached in memory unless a cache file shared by every worker is given
+cache_backend = SQLiteBackend(os.environ["RGARMIN_CACHE"]) if os.getenv("RGARMIN_CACHE") else None
+# tokens can also be bootstrapped from the output of garth's dumps, workers never prompt for credentials
+garmin = AsyncGarminClient(
+    cache=ResponseCache(policy=GarminClient.CACHE_POLICY, backend=cache_backend, namespace=DEFAULT_ACCOUNT),
+    tokens=os.getenv("RGARMIN_TOKENS"),
+    interactive=False,
+)
+store = ActivityStore(os.getenv("RGARMIN_STORE", ".garminconnect/activities.sqlite3"))
+# comma separated display names of the connections whose current and previous weeks are kept warm
+refresher = RefreshScheduler(garmin, store, [c for c in os.getenv("RGARMIN_REFRESH_CONNECTIONS", "").split(",") if c])
+
+stores: dict[str, ActivityStore] = {DEFAULT_ACCOUNT: store}
+
+
+def _close_store(account: str):
+    # the store of an account is opened with its client and closed along with it
+    account_store = stores.pop(account, None)
+    if account_store is not None:
+        account_store.close()
+
+
+# comma separated name=tokenstore pairs of the accounts served besides the default one, selected with ?account=name
+pool = GarminClientPool(
+    dict(a.split("=", 1) for a in os.getenv("RGARMIN_ACCOUNTS", "").split(",") if a),
+    cache_backend=cache_backend,
+    on_evict=_close_store,
+)
+pool.pin(DEFAULT_ACCOUNT, garmin)
+
+
+async def get_account(request: Request, account: str | None = Query(None)) -> Account:
+    """
+    Resolve the client, store and refresher of the account of a request.
+    The account is taken from the 'account' query param or from the cookie set the last time it was given.
+    """
+    account = account or request.cookies.get(ACCOUNT_COOKIE) or DEFAULT_ACCOUNT
+    try:
+        client = await pool.get(account)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown account: {account}.")
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail=f"Account {account} is not logged in.")
+
+    if account not in stores:
+        # activities are stored per account, as each one only syncs what its user can see
+        tokenstore = os.path.expanduser(pool.tokenstores[account])
+        stores[account] = ActivityStore(os.path.join(tokenstore, "activities.sqlite3"))
+    # only the default account is kept warm, the rest are synced on demand
+    return client, stores[account], refresher if account == DEFAULT_ACCOUNT else None
+
+
+@app.middleware("http")
+async def remember_account(request: Request, call_next):
+    response = await call_next(request)
+    account = request.query_params.get("account")
+    if account and response.status_code < 400:
+        response.set_cookie(ACCOUNT_COOKIE, account, httponly=True, samesite="lax")
+    return response
 
 
 @app.get("/")
@@ -34,46 +142,151 @@ async def index(_: Request):
 
 
 @app.get("/connections")
-async def list_connections(request: Request, partial: bool = Query(False, alias="p")):
-    connections = garmin.get_connections()
+async def list_connections(
+    request: Request,
+    partial: bool = Query(False, alias="p"),
+    account: Account = Depends(get_account),
+):
+    garmin, store, _ = account
+    connections = await activities.get_profiles(garmin, store)
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept, HX-Request, Cookie"}
+    headers["ETag"] = _etag(request, hashlib.sha1(to_json(connections)).hexdigest(), partial)
+    if _is_not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
     if "text/html" in request.headers["accept"]:
         is_htmx = request.headers.get("HX-Request", False)
         return templates.TemplateResponse(
             request=request,
             name="connections.html.jinja2" if partial and is_htmx else "_base.html.jinja2",
             context={"connections": connections, "page": "connections.html.jinja2"},
+            headers=headers,
         )
-    return JSONResponse(content=jsonable_encoder(connections))
+    return _json_response(connections, headers=headers)
 
 
 @app.get("/activities")
 async def list_activities(
     request: Request,
     connections: list[str] = Query(...),
-    start_date: date = Query(datetime.today().date()),
+    start_date: date | None = Query(None),
     end_date: date | None = Query(None),
     partial: bool = Query(False, alias="p"),
+    stream: bool = Query(True),
+    omit_none: bool = Query(False),
+    account: Account = Depends(get_account),
 ):
+    garmin, store, refresher = account
+    # same as /load, today as of this request
+    start_date = start_date or date.today()
     if not end_date:
         start_date, end_date = week_range_from_date(start_date)
 
     if not connections or len(connections) == 0:
         raise HTTPException(status_code=400, detail="At least one connection is required.")
-    if len(connections) > 10:
-        raise HTTPException(status_code=400, detail="Too many connections. Maximum allowed: 10.")
+    if len(connections) > MAX_CONNECTIONS:
+        raise HTTPException(status_code=400, detail=f"Too many connections. Maximum allowed: {MAX_CONNECTIONS}.")
     if end_date < start_date:
         raise HTTPException(status_code=400, detail="End date must be greater than start date.")
-    if weeks_between(start_date, end_date) > timedelta(weeks=2):
-        raise HTTPException(status_code=400, detail="Maximum allowed date range is 2 weeks.")
+    if weeks_between(start_date, end_date) > MAX_DATE_RANGE:
+        raise HTTPException(status_code=400, detail=f"Maximum allowed date range is {MAX_DATE_RANGE.days // 7} weeks.")
+
+    # ranges that have to be synced first have no version, they are neither cached nor validated
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept, HX-Request, Cookie"}
+    version = activities.get_activities_version(garmin, store, connections, start_date, end_date, refresher)
+    if version is not None:
+        data_version, is_final = version
+        headers["ETag"] = _etag(request, data_version, partial, stream, omit_none)
+        if is_final:
+            # final weeks are never synced again, but they are per account and show the profiles
+            headers["Cache-Control"] = f"private, max-age={int(activities.PROFILES_TTL.total_seconds())}"
+        if _is_not_modified(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
 
     if "text/html" in request.headers["accept"]:
         is_htmx = request.headers.get("HX-Request", False)
-        context = activities.get_html_activities(garmin, connections, start_date, end_date)
+        if stream and not (partial and is_htmx):
+            # htmx swaps partials once they are complete, so only full page loads are streamed
+            sections = activities.stream_html_activities(garmin, store, connections, start_date, end_date, refresher)
+            return StreamingResponse(_render_sections(request, sections), media_type="text/html", headers=headers)
+        context = await activities.get_html_activities(garmin, store, connections, start_date, end_date, refresher)
         context["page"] = "activities.html.jinja2"
         return templates.TemplateResponse(
             request=request,
             name="activities.html.jinja2" if partial and is_htmx else "_base.html.jinja2",
             context=context,
+            headers=headers,
         )
-    response = activities.get_json_activities(garmin, connections, start_date, end_date)
-    return JSONResponse(content=jsonable_encoder(response))
+    if "application/x-ndjson" in request.headers["accept"]:
+        records = activities.stream_json_activities(garmin, store, connections, start_date, end_date, refresher)
+        return StreamingResponse(
+            _render_records(records, omit_none), media_type="application/x-ndjson", headers=headers
+        )
+    response = await activities.get_json_activities(garmin, store, connections, start_date, end_date, refresher)
+    return _json_response(response, omit_none, headers)
+
+
+def _json_response(content: Any, omit_none: bool = False, headers: dict[str, str] | None = None) -> Response:
+    # the types encoders already produce the body, skipping the jsonable_encoder pass of JSONResponse
+    return Response(content=to_json(content, omit_none), media_type="application/json", headers=headers)
+
+
+def _etag(request: Request, version: str, *options: Any) -> str:
+    # the same data is rendered differently for each format and query options
+    variant = f"{request.headers.get('accept')}:{request.headers.get('HX-Request')}:{options}"
+    return f'W/"{hashlib.sha1(f"{version}:{variant}".encode()).hexdigest()}"'
+
+
+def _is_not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    # validators are compared weakly, as required for If-None-Match
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+async def _render_sections(request: Request, sections: AsyncIterator[dict]) -> AsyncIterator[str]:
+    tail = ""
+    async for context in sections:
+        if context["section"] == "shell":
+            page = templates.get_template("_base.html.jinja2").render(
+                request=request, page="activities.html.jinja2", **context
+            )
+            # sections are streamed inside the body, right after the shell
+            head, tail = page.split("</main>", 1)
+            yield f"{head}</main>"
+        else:
+            yield templates.get_template("_activities_stream.html.jinja2").render(request=request, **context)
+    yield tail
+
+
+async def _render_records(records: AsyncIterator[dict], omit_none: bool = False) -> AsyncIterator[bytes]:
+    async for record in records:
+        yield to_json(record, omit_none) + b"\n"
+
+
+@app.get("/load")
+async def training_load(
+    connections: list[str] = Query([]),
+    start_date: date | None = Query(None),
+    end_date: date | None = Query(None),
+    account: Account = Depends(get_account),
+):
+    garmin, store, refresher = account
+    # resolved for each request, a default in the signature would be the day the worker started
+    end_date = end_date or date.today()
+    if not start_date:
+        start_date = end_date - timedelta(weeks=DEFAULT_LOAD_WEEKS - 1)
+
+    if len(connections) > MAX_CONNECTIONS:
+        raise HTTPException(status_code=400, detail=f"Too many connections. Maximum allowed: {MAX_CONNECTIONS}.")
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="End date must be greater than start date.")
+    if weeks_between(start_date, end_date) > MAX_LOAD_DATE_RANGE:
+        raise HTTPException(
+            status_code=400, detail=f"Maximum allowed date range is {MAX_LOAD_DATE_RANGE.days // 7} weeks."
+        )
+
+    response = await load.get_json_load(garmin, store, connections, start_date, end_date, refresher)
+    return _json_response(response)
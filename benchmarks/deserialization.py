@@ -0,0 +1,171 @@
+import argparse
+import logging
+import os
+import timeit
+from dataclasses import MISSING, fields
+from datetime import datetime
+from inspect import signature
+
+from pyutils.dicts import camel_to_snake_dict
+from rgarmin.types import Activity, ActivityListItem, ActivityType, DailySummary
+from rgarmin.types.activity import Summary
+
+logger = logging.getLogger(__name__)
+
+# keys sent by Garmin in each activity list item that are not mapped by ActivityListItem
+EXTRA_ACTIVITY_KEYS = [
+    "ownerId",
+    "ownerDisplayName",
+    "ownerFullName",
+    "ownerProfileImageUrlSmall",
+    "ownerProfileImageUrlMedium",
+    "ownerProfileImageUrlLarge",
+    "calories",
+    "bmrCalories",
+    "steps",
+    "userPro",
+    "eventType",
+    "privacy",
+    "userRoles",
+    "favorite",
+    "decoDive",
+    "pr",
+    "parent",
+    "manualActivity",
+    "autoCalcCalories",
+    "elevationCorrected",
+    "atpActivity",
+    "purposeful",
+    "manufacturer",
+    "vO2MaxValue",
+    "deviceId",
+    "minTemperature",
+    "maxTemperature",
+    "timeZoneId",
+    "beginTimestamp",
+    "lapCount",
+    "waterEstimated",
+    "trainingEffectLabel",
+    "minActivityLapDuration",
+    "aerobicTrainingEffectMessage",
+    "anaerobicTrainingEffectMessage",
+    "moderateIntensityMinutes",
+    "vigorousIntensityMinutes",
+    "differenceBodyBattery",
+    "hasHeatMap",
+    "hasPolyline",
+    "hasVideo",
+    "locationName",
+]
+
+
+def _camel(name: str) -> str:
+    head, *tail = name.split("_")
+    return head + "".join(t.capitalize() for t in tail)
+
+
+def _value(field_type: object) -> object:
+    name = str(field_type)
+    if "float" in name:
+        return 1234.5
+    if "int" in name:
+        return 42
+    if "bool" in name:
+        return True
+    if "list" in name:
+        return []
+    return "value"
+
+
+def _payload(cls: type, overrides: dict) -> dict:
+    data = {_camel(f.name): _value(f.type) for f in fields(cls) if f.default is MISSING or f.name in overrides}
+    data.update({_camel(k): v for k, v in overrides.items()})
+    return data
+
+
+def activity_type_payload() -> dict:
+    return _payload(ActivityType, {"type_key": "running"})
+
+
+def activity_list_item_payload(i: int) -> dict:
+    data = _payload(
+        ActivityListItem,
+        {
+            "activity_id": i,
+            "start_time_local": "2025-03-17 10:00:00",
+            "start_time_gmt": "2025-03-17 09:00:00",
+            "activity_type": activity_type_payload(),
+            "distance": 10000.0,
+            "duration": 3600.0,
+            "average_hr": 150.0,
+            "hr_time_in_zone_1": 600.0,
+            "hr_time_in_zone_2": 1200.0,
+        },
+    )
+    data.pop("weekday")
+    data.update({k: 1 for k in EXTRA_ACTIVITY_KEYS})
+    return data
+
+
+def activity_payload(i: int) -> dict:
+    return {
+        "activityId": i,
+        "activityName": "Running",
+        "activityTypeDTO": activity_type_payload(),
+        "summaryDTO": _payload(Summary, {}),
+        "userProfileId": 1,
+        "isMultiSportParent": False,
+        "eventTypeDTO": {"typeId": 9, "typeKey": "uncategorized", "sortOrder": 10},
+        "accessControlRuleDTO": {"typeId": 2, "typeKey": "private"},
+        "timeZoneUnitDTO": {"unitId": 124, "unitKey": "Europe/Paris", "factor": 0.0, "timeZone": "Europe/Paris"},
+        "metadataDTO": {k: 1 for k in EXTRA_ACTIVITY_KEYS},
+    }
+
+
+def daily_summary_payload(_: int) -> dict:
+    return _payload(DailySummary, {})
+
+
+def _legacy_from_dict(cls: type, data: dict) -> object:
+    # deserialization path used before the precompiled decoders
+    data = camel_to_snake_dict(data)
+    if cls is ActivityListItem:
+        data["activity_type"] = _legacy_from_dict(ActivityType, data["activity_type"])
+        data["start_time_local"] = datetime.fromisoformat(data["start_time_local"])
+        data["start_time_gmt"] = datetime.fromisoformat(data["start_time_gmt"])
+        data["weekday"] = data["start_time_local"].strftime("%A")
+    if cls is Activity:
+        data = {k.replace("_dto", ""): v for k, v in data.items()}
+        data["activity_type"] = _legacy_from_dict(ActivityType, data["activity_type"])
+        data["summary"] = _legacy_from_dict(Summary, data["summary"])
+    valid_keys = set(signature(cls).parameters.keys())
+    logger.debug(f"ignoring keys: {set(data.keys()) - valid_keys}")
+    return cls(**{k: v for k, v in data.items() if k in valid_keys})
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=10_000, help="items decoded in each run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each benchmark, the best one is reported")
+    return parser.parse_args()
+
+
+def main(items: int, repeat: int):
+    cases = [
+        (ActivityListItem, activity_list_item_payload),
+        (Activity, activity_payload),
+        (DailySummary, daily_summary_payload),
+    ]
+    print(f"{'type':<20}{'legacy items/s':>18}{'decoder items/s':>18}{'speedup':>10}")
+    for cls, build in cases:
+        payloads = [build(i) for i in range(items)]
+        legacy = min(timeit.repeat(lambda: [_legacy_from_dict(cls, p) for p in payloads], number=1, repeat=repeat))
+        decoder = min(timeit.repeat(lambda: [cls.from_dict(p) for p in payloads], number=1, repeat=repeat))
+        print(f"{cls.__name__:<20}{items / legacy:>18,.0f}{items / decoder:>18,.0f}{legacy / decoder:>9.1f}x")
+
+
+if __name__ == "__main__":
+    args = _parse_arguments()
+    logger.info(f"{os.path.basename(__file__)}:: args -> {args.__dict__}")
+
+    main(args.items, args.repeat)
@@ -0,0 +1,83 @@
+import argparse
+import logging
+import os
+import random
+import timeit
+from datetime import datetime, timedelta
+
+from benchmarks.deserialization import activity_list_item_payload
+
+from rgarmin.frame import ActivityFrame
+from rgarmin.types import ActivityListItem
+
+logger = logging.getLogger(__name__)
+
+TYPE_KEYS = ["running", "cycling", "lap_swimming", "strength_training", "trail_running"]
+
+
+def club_activities(athletes: int, weeks: int, per_week: int) -> dict[str, list[ActivityListItem]]:
+    rng = random.Random(0)
+    season_start = datetime(2025, 1, 6, 8)
+    activities = {}
+    for athlete in range(athletes):
+        items = []
+        for i in range(weeks * per_week):
+            data = activity_list_item_payload(athlete * 100_000 + i)
+            start = season_start + timedelta(days=i // per_week * 7 + rng.randrange(7), hours=rng.randrange(12))
+            data["startTimeLocal"] = data["startTimeGMT"] = start.isoformat(sep=" ")
+            data["activityType"] = dict(data["activityType"], typeKey=rng.choice(TYPE_KEYS))
+            data["distance"] = rng.uniform(2_000, 40_000)
+            data["duration"] = rng.uniform(1_200, 10_000)
+            data["averageHR"] = rng.uniform(110, 170) if rng.random() > 0.1 else None
+            items.append(ActivityListItem.from_dict(data))
+        activities[f"athlete{athlete}"] = items
+    return activities
+
+
+def _loop_weekly_volume(activities: dict[str, list[ActivityListItem]]) -> dict:
+    # aggregate as it would be done without the frame
+    results = {}
+    for owner, items in activities.items():
+        for item in items:
+            day = item.start_time_local.date()
+            key = (owner, day - timedelta(days=day.weekday()), item.activity_type.type_key)
+            totals = results.setdefault(key, {"count": 0, "distance": 0.0, "duration": 0.0})
+            totals["count"] += 1
+            totals["distance"] += item.distance or 0.0
+            totals["duration"] += item.duration or 0.0
+    return results
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--athletes", type=int, default=50, help="athletes in the club")
+    parser.add_argument("--weeks", type=int, default=52, help="weeks in the season")
+    parser.add_argument("--per-week", type=int, default=6, help="activities of each athlete per week")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each benchmark, the best one is reported")
+    return parser.parse_args()
+
+
+def main(athletes: int, weeks: int, per_week: int, repeat: int):
+    activities = club_activities(athletes, weeks, per_week)
+    total = sum(len(items) for items in activities.values())
+    frame = ActivityFrame.from_owners(activities)
+    fields = ["distance", "duration"]
+
+    cases = [
+        ("build frame", lambda: ActivityFrame.from_owners(activities)),
+        ("loop weekly volume", lambda: _loop_weekly_volume(activities)),
+        ("frame weekly volume", lambda: frame.group_by(["owner", "week", "type_key"], fields)),
+        ("frame season totals", lambda: frame.group_by("owner")),
+        ("frame season hr mean", lambda: frame.group_by(["owner", "type_key"], ["average_hr"], how="mean")),
+    ]
+    print(f"{total:,} activities")
+    for name, run in cases:
+        elapsed = min(timeit.repeat(run, number=1, repeat=repeat))
+        print(f"{name:<24}{elapsed * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    args = _parse_arguments()
+    logger.info(f"{os.path.basename(__file__)}:: args -> {args.__dict__}")
+
+    main(args.athletes, args.weeks, args.per_week, args.repeat)
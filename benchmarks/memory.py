@@ -0,0 +1,87 @@
+import argparse
+import logging
+import os
+import tracemalloc
+from dataclasses import fields, make_dataclass
+
+from benchmarks.deserialization import activity_list_item_payload, activity_payload, daily_summary_payload
+
+from rgarmin.types import Activity, ActivityListItem, ActivityType, DailySummary
+from rgarmin.types.activity import Summary
+
+logger = logging.getLogger(__name__)
+
+
+def _unslotted(cls: type) -> type:
+    # same fields as the model but with a per-instance __dict__, as the models were defined before
+    params = cls.__dataclass_params__  # type: ignore[attr-defined]
+    spec = [(f.name, f.type, f) for f in fields(cls)]
+    return make_dataclass(f"Unslotted{cls.__name__}", spec, frozen=params.frozen, eq=False)
+
+
+_LEGACY = {cls: _unslotted(cls) for cls in (ActivityType, ActivityListItem, Summary, Activity, DailySummary)}
+
+
+def _legacy_activity_list_item(data: dict) -> object:
+    item = ActivityListItem.from_dict(data)
+    kwargs = {f.name: getattr(item, f.name) for f in fields(item)}
+    kwargs["activity_type"] = _LEGACY[ActivityType](**_fields(item.activity_type))
+    kwargs["weekday"] = item.start_time_local.strftime("%A")
+    return _LEGACY[ActivityListItem](**kwargs)
+
+
+def _legacy_activity(data: dict) -> object:
+    activity = Activity.from_dict(data)
+    return _LEGACY[Activity](
+        activity_id=activity.activity_id,
+        activity_name=activity.activity_name,
+        activity_type=_LEGACY[ActivityType](**_fields(activity.activity_type)),
+        summary=_LEGACY[Summary](**_fields(activity.summary)),
+    )
+
+
+def _legacy_daily_summary(data: dict) -> object:
+    return _LEGACY[DailySummary](**_fields(DailySummary.from_dict(data)))
+
+
+def _fields(obj: object) -> dict:
+    return {f.name: getattr(obj, f.name) for f in fields(obj)}  # type: ignore[arg-type]
+
+
+def _bytes_per_item(build, payloads: list[dict]) -> float:
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    items = [build(p) for p in payloads]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(items) == len(payloads)
+    return (after - before) / len(payloads)
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=10_000, help="items kept in memory for each measure")
+    return parser.parse_args()
+
+
+def main(items: int):
+    cases = [
+        (ActivityListItem, activity_list_item_payload, _legacy_activity_list_item),
+        (Activity, activity_payload, _legacy_activity),
+        (DailySummary, daily_summary_payload, _legacy_daily_summary),
+    ]
+    print(f"{'type':<20}{'legacy bytes':>16}{'slotted bytes':>16}{'reduction':>12}")
+    for cls, build, legacy_build in cases:
+        payloads = [build(i) for i in range(items)]
+        # build the inputs of both paths upfront, so only the retained items are measured
+        legacy_inputs = [dict(p) for p in payloads]
+        legacy = _bytes_per_item(legacy_build, legacy_inputs)
+        slotted = _bytes_per_item(cls.from_dict, payloads)
+        print(f"{cls.__name__:<20}{legacy:>16,.0f}{slotted:>16,.0f}{1 - slotted / legacy:>11.0%}")
+
+
+if __name__ == "__main__":
+    args = _parse_arguments()
+    logger.info(f"{os.path.basename(__file__)}:: args -> {args.__dict__}")
+
+    main(args.items)
@@ -0,0 +1,113 @@
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+import timeit
+from datetime import date, datetime, timedelta
+from typing import Any
+from urllib.parse import parse_qsl
+
+from benchmarks.deserialization import activity_list_item_payload
+
+from rgarmin.archive import ResponseArchive
+from rgarmin.client import GarminClient
+
+logger = logging.getLogger(__name__)
+
+SEASON_START = datetime(2025, 1, 6, 8)
+
+
+class _RecordingClient(GarminClient):
+    # replays the archive, recording the pages of the synthetic feeds that are not in it yet
+    feeds: dict[str, list[dict]]
+
+    def archived(self, path: str, params: dict | None = None) -> Any:
+        if self.archive.raw(path, params) is None:
+            feed = self.feeds[path.rsplit("/", 1)[-1]]
+            start, limit = int(params["start"]), int(params["limit"])
+            self.archive.record(path, params, {"activityList": feed[start : start + limit]})
+        return super().archived(path, params)
+
+
+def _feed(athlete: int, weeks: int, per_week: int) -> list[dict]:
+    # newest first, as Garmin sends them
+    rng = random.Random(athlete)
+    items = []
+    for i in range(weeks * per_week):
+        data = activity_list_item_payload(athlete * 100_000 + i)
+        start = SEASON_START + timedelta(days=i // per_week * 7 + rng.randrange(7), hours=rng.randrange(12))
+        data["startTimeLocal"] = data["startTimeGMT"] = start.isoformat(sep=" ")
+        data["distance"] = rng.uniform(2_000, 40_000)
+        data["duration"] = rng.uniform(1_200, 10_000)
+        items.append(data)
+    return sorted(items, key=lambda a: a["startTimeLocal"], reverse=True)
+
+
+def _week_ranges(weeks: int) -> list[tuple[date, date]]:
+    # browsed back from the newest week, as the web interface does
+    mondays = [SEASON_START.date() + timedelta(weeks=w) for w in reversed(range(weeks))]
+    return [(monday, monday + timedelta(days=6)) for monday in mondays]
+
+
+def _replay(client: GarminClient, athletes: int, weeks: int) -> int:
+    activities = 0
+    for start_date, end_date in _week_ranges(weeks):
+        for athlete in range(athletes):
+            activities += len(client.get_connection_activities_by_date(f"athlete{athlete}", start_date, end_date))
+    return activities
+
+
+def build_archive(path: str, athletes: int, weeks: int, per_week: int):
+    with ResponseArchive(path) as archive:
+        client = _RecordingClient(tokenstore=os.path.dirname(path), archive=archive, replay=True)
+        client.feeds = {f"athlete{a}": _feed(a, weeks, per_week) for a in range(athletes)}
+        _replay(client, athletes, weeks)
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--archive", type=str, default=None, help="archive file, built if it doesn't exist")
+    parser.add_argument("--athletes", type=int, default=50, help="athletes in the club")
+    parser.add_argument("--weeks", type=int, default=52, help="weeks in the season")
+    parser.add_argument("--per-week", type=int, default=6, help="activities of each athlete per week")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each benchmark, the best one is reported")
+    return parser.parse_args()
+
+
+def main(path: str | None, athletes: int, weeks: int, per_week: int, repeat: int):
+    path = path or os.path.join(tempfile.mkdtemp(), "responses.archive")
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        build_archive(path, athletes, weeks, per_week)
+        print(f"built {path} in {time.perf_counter() - started:.1f} s")
+
+    with ResponseArchive(path, readonly=True) as archive:
+        requests = [(p, dict(parse_qsl(query))) for p, query in (k.split("?", 1) for k in archive.keys())]
+        print(f"{len(archive):,} responses, {os.path.getsize(path) / 2**20:,.1f} MiB")
+
+        def replay() -> int:
+            # a new client each time, so neither the response cache nor the offsets of the feeds are warm
+            client = GarminClient(tokenstore=os.path.dirname(path), archive=archive, replay=True)
+            return _replay(client, athletes, weeks)
+
+        activities = replay()
+        cases = [
+            ("open archive", lambda: ResponseArchive(path, readonly=True).close()),
+            ("slice bodies", lambda: [archive.raw(p, params) for p, params in requests]),
+            ("decode bodies", lambda: [archive.get(p, params) for p, params in requests]),
+            ("replay weeks", replay),
+        ]
+        print(f"{activities:,} activities in {athletes * weeks:,} athlete weeks")
+        for name, run in cases:
+            elapsed = min(timeit.repeat(run, number=1, repeat=repeat))
+            print(f"{name:<20}{elapsed * 1000:>10.1f} ms")
+        print(f"{activities / elapsed:,.0f} activities/s replayed")
+
+
+if __name__ == "__main__":
+    args = _parse_arguments()
+    logger.info(f"{os.path.basename(__file__)}:: args -> {args.__dict__}")
+
+    main(args.archive, args.athletes, args.weeks, args.per_week, args.repeat)
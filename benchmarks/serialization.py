@@ -0,0 +1,69 @@
+import argparse
+import json
+import logging
+import os
+import timeit
+
+from benchmarks.frame import club_activities
+from fastapi.encoders import jsonable_encoder
+
+from rgarmin.types import Connection, to_json
+
+logger = logging.getLogger(__name__)
+
+
+def week_payload(athletes: int, per_week: int) -> dict:
+    # same shape as the JSON response of /activities
+    activities = club_activities(athletes, 1, per_week)
+    return {
+        "pagination": {"start_date": "06-01-2025", "end_date": "12-01-2025", "next_url": "", "prev_url": ""},
+        "connection_activities": [
+            {
+                "display_name": owner,
+                "profile": Connection(i, owner, owner.title(), "", 1, "", "", ""),
+                "activities": items,
+            }
+            for i, (owner, items) in enumerate(activities.items())
+        ],
+        "errors": {},
+        "groups": {},
+    }
+
+
+def _jsonable_encoder_response(payload: dict) -> bytes:
+    # what JSONResponse(content=jsonable_encoder(payload)) does
+    content = jsonable_encoder(payload)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--athletes", type=int, default=10, help="athletes in the week view")
+    parser.add_argument("--per-week", type=int, default=6, help="activities of each athlete in the week")
+    parser.add_argument("--number", type=int, default=50, help="responses encoded in each run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each benchmark, the best one is reported")
+    return parser.parse_args()
+
+
+def main(athletes: int, per_week: int, number: int, repeat: int):
+    payload = week_payload(athletes, per_week)
+    assert json.loads(to_json(payload)) == json.loads(_jsonable_encoder_response(payload))
+
+    cases = [
+        ("jsonable_encoder", lambda: _jsonable_encoder_response(payload)),
+        ("to_json", lambda: to_json(payload)),
+        ("to_json omit_none", lambda: to_json(payload, omit_none=True)),
+    ]
+    print(f"{athletes * per_week} activities of {athletes} athletes")
+    baseline = None
+    for name, run in cases:
+        elapsed = min(timeit.repeat(run, number=number, repeat=repeat)) / number
+        baseline = baseline or elapsed
+        print(f"{name:<20}{elapsed * 1000:>10.2f} ms{baseline / elapsed:>8.1f}x{len(run()):>10,} bytes")
+
+
+if __name__ == "__main__":
+    args = _parse_arguments()
+    logger.info(f"{os.path.basename(__file__)}:: args -> {args.__dict__}")
+
+    main(args.athletes, args.per_week, args.number, args.repeat)
@@ -0,0 +1,158 @@
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections.abc import Iterator
+from typing import Any
+from urllib.parse import urlencode
+
+from rgarmin.cache import MISSING
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RGARMIN-ARCHIVE-1\n"
+RECORD_HEADER = struct.Struct("<dII")  # timestamp, key length, body length
+
+
+class ResponseArchive:
+    """
+    Append-only file of raw Garmin Connect responses, used to replay them without requesting Garmin again.
+    Each record is the time it was stored, the key of the request (path and sorted params, as in the response cache)
+    and the JSON body as sent by Garmin. Only the record headers are read when the file is opened, bodies are sliced
+    from a memory map of the file when they are requested, so opening large archives is cheap.
+    A single process must write to a file at a time, any number of them can read it.
+    """
+
+    def __init__(self, path: str, readonly: bool = False):
+        """
+        :param path: Archive file, created if it doesn't exist
+        :param readonly: Open the archive only to replay it
+        """
+        self.path = path
+        self.readonly = readonly
+        self._index: dict[str, list[tuple[float, int, int]]] = {}  # timestamp, offset and length of each body
+        self._lock = threading.Lock()
+        self._mmap: mmap.mmap | None = None
+
+        if not readonly and not os.path.exists(path):
+            with open(path, "wb") as file:
+                file.write(MAGIC)
+        self._file = open(path, "rb" if readonly else "r+b")
+        self._size = self._load_index()
+        if not readonly:
+            # drop the tail of a record interrupted while being written, so new records are appended after a valid one
+            self._file.truncate(self._size)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._index.values())
+
+    def __enter__(self) -> "ResponseArchive":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            # maps with views still in use are closed once the views are released
+            self._mmap = None
+            self._file.close()
+
+    @staticmethod
+    def key(path: str, params: dict | None = None) -> str:
+        return f"{path}?{urlencode(sorted((params or {}).items()))}"
+
+    def keys(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def append(self, path: str, params: dict | None, body: bytes, timestamp: float | None = None):
+        """
+        Store the raw body of a response.
+        :param path: Endpoint path
+        :param params: (Optional) Query params
+        :param body: JSON body of the response
+        :param timestamp: (Optional) Time the response was received, now by default
+        """
+        assert not self.readonly, "archive opened as read only"
+        timestamp = time.time() if timestamp is None else timestamp
+        key = self.key(path, params).encode()
+        with self._lock:
+            self._file.seek(self._size)
+            self._file.write(RECORD_HEADER.pack(timestamp, len(key), len(body)) + key + body)
+            self._file.flush()
+            offset = self._size + RECORD_HEADER.size + len(key)
+            self._add(key.decode(), timestamp, offset, len(body))
+            self._size = offset + len(body)
+
+    def record(self, path: str, params: dict | None, response: Any):
+        """
+        Store a response already decoded from JSON.
+        """
+        self.append(path, params, json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode())
+
+    def raw(self, path: str, params: dict | None = None, at: float | None = None) -> memoryview | None:
+        """
+        :param path: Endpoint path
+        :param params: (Optional) Query params
+        :param at: (Optional) Return the response stored last at this time, the last one by default
+        :return: A view of the body in the archive, without copying it, or None if there is no response stored
+        """
+        entries = self._index.get(self.key(path, params))
+        if not entries:
+            return None
+        i = len(entries) if at is None else bisect.bisect_right(entries, at, key=lambda e: e[0])
+        if i == 0:
+            return None
+        _, offset, length = entries[i - 1]
+        return self._view()[offset : offset + length]
+
+    def get(self, path: str, params: dict | None = None, at: float | None = None) -> Any:
+        """
+        Return the decoded response or MISSING if there is no response stored (see raw).
+        """
+        body = self.raw(path, params, at)
+        # the json module only decodes bytes, so this is the one copy of the body
+        return MISSING if body is None else json.loads(body.tobytes())
+
+    def _view(self) -> memoryview:
+        with self._lock:
+            if self._mmap is None or len(self._mmap) < self._size:
+                # records appended after the file was mapped need a new map, the old one is kept alive by its views
+                self._mmap = mmap.mmap(self._file.fileno(), self._size, access=mmap.ACCESS_READ)
+            return memoryview(self._mmap)
+
+    def _add(self, key: str, timestamp: float, offset: int, length: int):
+        entries = self._index.setdefault(key, [])
+        if entries and entries[-1][0] > timestamp:
+            bisect.insort(entries, (timestamp, offset, length))
+        else:
+            entries.append((timestamp, offset, length))
+
+    def _load_index(self) -> int:
+        self._file.seek(0)
+        if self._file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"not a response archive: {self.path}")
+
+        size = os.fstat(self._file.fileno()).st_size
+        offset = len(MAGIC)
+        while header := self._file.read(RECORD_HEADER.size):
+            if len(header) < RECORD_HEADER.size:
+                break
+            timestamp, key_length, body_length = RECORD_HEADER.unpack(header)
+            key = self._file.read(key_length)
+            body_offset = offset + RECORD_HEADER.size + key_length
+            # bodies are skipped, they are only mapped when requested
+            end = self._file.seek(body_length, os.SEEK_CUR)
+            if len(key) < key_length or end > size:
+                break
+            self._add(key.decode(), timestamp, body_offset, body_length)
+            offset = end
+
+        logger.debug(f"loaded {len(self)} responses from {self.path}")
+        if offset < size:
+            logger.warning(f"ignoring an incomplete record at the end of {self.path}")
+        return offset
@@ -0,0 +1,447 @@
+import asyncio
+import logging
+from collections import deque
+from collections.abc import AsyncIterator, Iterable
+from contextlib import aclosing
+from datetime import date
+from typing import Any
+
+import garth as g
+import httpx
+from garth.exc import GarthHTTPError
+from garth.http import USER_AGENT
+from requests import HTTPError, Response
+
+from rgarmin.archive import ResponseArchive
+from rgarmin.cache import MISSING, ResponseCache
+from rgarmin.client import DEFAULT_PAGE_SIZE, DETAILS_CONCURRENCY, POOL_SIZE, PREFETCH_PAGES, GarminClient
+from rgarmin.paging import OffsetIndex, RangeCollector, Readahead, feed_page, seek_feed
+from rgarmin.ratelimit import RETRY_METHODS, RateLimiter
+from rgarmin.singleflight import AsyncSingleFlight
+from rgarmin.types import Activity, ActivityListItem, ActivityType, Connection, DailySummary, UserProfile, UserSettings
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncGarminClient:
+    """
+    Asyncio counterpart of GarminClient exposing the same methods as coroutines.
+    Token handling (token store, interactive login and OAuth2 refresh) is delegated to a wrapped GarminClient while the
+    API requests go through a single pooled httpx session, so awaiting Garmin never blocks the event loop.
+    """
+
+    client: GarminClient
+    session: httpx.AsyncClient
+    inflight: AsyncSingleFlight
+    ConnectURL = GarminClient.ConnectURL
+    to_garmin_date = GarminClient.to_garmin_date
+    search_params = GarminClient.search_params
+    feed_path = GarminClient.feed_path
+
+    @property
+    def garth(self) -> g.Client:
+        return self.client.garth
+
+    @property
+    def cache(self) -> ResponseCache:
+        return self.client.cache
+
+    @property
+    def offsets(self) -> OffsetIndex:
+        return self.client.offsets
+
+    @property
+    def limiter(self) -> RateLimiter:
+        return self.client.limiter
+
+    @property
+    def profile(self) -> UserProfile:
+        return self.client.profile
+
+    @property
+    def settings(self) -> UserSettings:
+        return self.client.settings
+
+    @property
+    def display_name(self) -> str:
+        return self.client.display_name
+
+    @property
+    def full_name(self) -> str:
+        return self.client.full_name
+
+    @property
+    def unit_system(self) -> str:
+        return self.client.unit_system
+
+    def __init__(
+        self,
+        is_cn=False,
+        tokenstore=".garminconnect",
+        cache: ResponseCache | None = None,
+        limiter: RateLimiter | None = None,
+        tokens: str | None = None,
+        interactive: bool = True,
+        archive: ResponseArchive | None = None,
+        replay: bool = False,
+    ):
+        self.client = GarminClient(
+            is_cn=is_cn,
+            tokenstore=tokenstore,
+            cache=cache,
+            limiter=limiter,
+            tokens=tokens,
+            interactive=interactive,
+            archive=archive,
+            replay=replay,
+        )
+        self.session = httpx.AsyncClient(
+            base_url=f"https://connectapi.{self.garth.domain}",
+            headers=USER_AGENT,
+            timeout=self.garth.timeout,
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+        )
+        self.inflight = AsyncSingleFlight()
+        self._refresh_lock = asyncio.Lock()
+
+    async def close(self):
+        await self.session.aclose()
+
+    async def request(self, method: str, path: str, params: dict | None = None) -> httpx.Response:
+        """
+        Send a request through the rate limiter shared with the wrapped client, retrying it while the limiter allows it.
+        """
+        attempt = 0
+        while True:
+            await self.limiter.acquire_async()
+            headers = {"Authorization": await self._authorization()}
+            try:
+                response = await self.session.request(method, path, params=params, headers=headers)
+            except httpx.TransportError as e:
+                # connection failures and timeouts are reported like HTTP errors, so callers fall back the same way
+                raise GarthHTTPError(msg="Error in request", error=HTTPError(str(e))) from e
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                retry_after = response.headers.get("Retry-After")
+                if not self.limiter.should_retry(
+                    response.status_code, attempt, retry_after, idempotent=method.upper() in RETRY_METHODS
+                ):
+                    raise _to_garth_error(e) from e
+                attempt += 1
+                continue
+            self.limiter.success()
+            return response
+
+    async def connectapi(self, path: str, params: dict | None = None, ttl: float | None = None) -> Any:
+        """
+        GET the given Garmin Connect path going through the response cache.
+        Concurrent calls for the same path and params share a single upstream request.
+        :param path: Endpoint path
+        :param params: (Optional) Query params
+        :param ttl: (Optional) Overrides the cache policy for this response, 0 skips caching
+        """
+        key = self.cache.key(path, params)
+        data = self.cache.get(key)
+        if data is MISSING:
+
+            async def fetch() -> Any:
+                if self.client.replay:
+                    data = self.client.archived(path, params)
+                else:
+                    response = await self.request("GET", path, params=params)
+                    data = None if response.status_code == 204 else response.json()
+                    if self.client.archive is not None:
+                        # the body is recorded as received, without encoding it again
+                        self.client.archive.append(path, params, response.content or b"null")
+                self.cache.set(key, data, self.cache.ttl_for(path) if ttl is None else ttl)
+                return data
+
+            data = await self.inflight.do(key, fetch)
+        return data
+
+    async def _authorization(self) -> str:
+        async with self._refresh_lock:
+            if not self.garth.oauth2_token or self.garth.oauth2_token.expired:
+                logger.debug("refreshing oauth2 token")
+                await asyncio.to_thread(self._refresh_tokens)
+        return str(self.garth.oauth2_token)
+
+    def _refresh_tokens(self):
+        self.garth.refresh_oauth2()
+        # saved so the next start doesn't have to refresh them again
+        self.client.dump_tokens()
+
+    async def load_account(self, refresh: bool = False):
+        """
+        Fetch the profile, settings and activity types concurrently, so they don't block the first time they are used.
+        :param refresh: Fetch them even if they are already in the snapshot of the token store
+        """
+        if self.client.has_account_data() and not refresh:
+            return
+        profile, settings, activity_types = await asyncio.gather(
+            self.connectapi(self.ConnectURL.CONNECTION),
+            self.connectapi(self.ConnectURL.USER_SETTINGS),
+            self.connectapi(self.ConnectURL.ACTIVITY_TYPES),
+        )
+        assert isinstance(profile, dict) and isinstance(settings, dict), "failed to get the account data"
+        assert isinstance(activity_types, list), "failed to get activity types"
+        self.client.set_account_data(profile, settings, activity_types)
+
+    async def get_activity_types(self) -> list[ActivityType]:
+        await self.load_account()
+        return self.client.activity_types
+
+    async def get_user_summary(self, cdate: str, display_name: str | None = None) -> DailySummary:
+        logger.debug("requesting user summary")
+        response = await self.connectapi(
+            f"{self.ConnectURL.DAILY_SUMMARY}/{display_name or self.display_name}",
+            params={"calendarDate": str(cdate)},
+        )
+        assert response is not None, "failed to get user summary"
+        assert not response["privacyProtected"], "user summary is private"
+        return DailySummary.from_dict(response)
+
+    async def get_activities(self, start: int = 0, limit: int = DEFAULT_PAGE_SIZE) -> list[ActivityListItem]:
+        logger.debug("requesting activities")
+        response = await self.connectapi(
+            self.ConnectURL.ACTIVITIES,
+            params={"start": start, "limit": limit},
+        )
+        assert response is not None, "failed to get activities"
+        assert all(isinstance(a, dict) for a in response), "invalid activity data"
+        return [ActivityListItem.from_dict(a) for a in response if isinstance(a, dict)]
+
+    async def get_activity(self, activity_id: str) -> Activity:
+        logger.debug(f"Requesting activity summary data for activity id {activity_id}")
+        response = await self.connectapi(f"{self.ConnectURL.ACTIVITY}/{activity_id}")
+        assert response is not None, "failed to get activity"
+        return Activity.from_dict(response)
+
+    async def get_activities_details(
+        self,
+        activity_ids: Iterable[int | str],
+        concurrency: int = DETAILS_CONCURRENCY,
+    ) -> tuple[dict[int | str, Activity], dict[int | str, GarthHTTPError]]:
+        """
+        Fetch the details of several activities concurrently.
+        :param activity_ids: Ids of the activities, repeated ids are only requested once
+        :param concurrency: Max requests in flight, bounded by the session pool size
+        :return: The activities that could be fetched and the error of each one that failed, both keyed by the given ids
+        """
+        activity_ids = list(dict.fromkeys(activity_ids))
+        semaphore = asyncio.Semaphore(max(1, min(concurrency, POOL_SIZE)))
+
+        async def fetch(activity_id: int | str) -> Activity:
+            async with semaphore:
+                return await self.get_activity(str(activity_id))
+
+        results = await asyncio.gather(*[fetch(i) for i in activity_ids], return_exceptions=True)
+        return GarminClient.split_details(activity_ids, results)
+
+    async def get_activities_by_date(
+        self,
+        start_date: date,
+        end_date: date,
+        activity_type: str | None = None,
+    ) -> list[ActivityListItem]:
+        """
+        Fetch available activities between specific dates
+        :param start_date: Datetime to be formated as YYYY-MM-DD
+        :param enddate: (Optional) Datetime to be formated as YYYY-MM-DD
+        :param activity_type: (Optional) Type of activity you are searching
+        """
+        return [a async for a in self.iter_activities_by_date(start_date, end_date, activity_type)]
+
+    async def iter_activities_by_date(
+        self,
+        start_date: date,
+        end_date: date,
+        activity_type: str | None = None,
+        prefetch: int = PREFETCH_PAGES,
+    ) -> AsyncIterator[ActivityListItem]:
+        """
+        Stream available activities between specific dates as their pages arrive
+        :param start_date: Datetime to be formated as YYYY-MM-DD
+        :param enddate: (Optional) Datetime to be formated as YYYY-MM-DD
+        :param activity_type: (Optional) Type of activity you are searching
+        :param prefetch: (Optional) Number of pages requested ahead in parallel, at least 1
+        """
+        logger.debug(f"requesting activities between {start_date} and {end_date}")
+
+        params = self.search_params(start_date, end_date, activity_type)
+        key = self.cache.key(self.ConnectURL.ACTIVITIES, params)
+        activities = self.cache.get(key)
+        if activities is not MISSING:
+            for a in activities:
+                yield ActivityListItem.from_dict(a)
+            return
+
+        activities = []
+        async with aclosing(self._iter_feed_pages(self.ConnectURL.ACTIVITIES, params, prefetch=prefetch)) as pages:
+            async for page in pages:
+                activities.extend(page)
+                for a in page:
+                    yield ActivityListItem.from_dict(a)
+
+        if end_date:
+            self.cache.set(key, activities, self.client.range_ttl(self.ConnectURL.ACTIVITIES, end_date))
+
+    async def _iter_feed_pages(
+        self,
+        path: str,
+        params: dict,
+        start: int = 0,
+        prefetch: int = 1,
+        first: list[dict] | None = None,
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Same as GarminClient._iter_feed_pages, with the pages requested ahead in tasks.
+        """
+        page_size = int(params["limit"])
+        if first is not None:
+            yield first
+            if len(first) < page_size:
+                return
+            start = start + page_size
+
+        def fetch(offset: int) -> asyncio.Task:
+            return asyncio.create_task(self._fetch_feed_page(path, {**params, "start": offset}))
+
+        readahead = Readahead(start, page_size, prefetch)
+        pending = deque(fetch(offset) for offset in readahead.offsets(0))
+        try:
+            while pending:
+                page = await pending.popleft()
+                yield page
+                if len(page) < page_size:
+                    break
+                readahead.grow()
+                pending.extend(fetch(offset) for offset in readahead.offsets(len(pending)))
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _fetch_feed_page(self, path: str, params: dict) -> list[dict]:
+        logger.debug(f"requesting activities {params['start']} to {int(params['start']) + int(params['limit'])}")
+        return feed_page(await self.connectapi(path, params=params, ttl=0))
+
+    async def get_connections(self, start: int = 0, limit: int = DEFAULT_PAGE_SIZE) -> list[Connection]:
+        logger.debug("requesting connections")
+        response = await self.connectapi(
+            self.ConnectURL.CONNECTIONS,
+            params={"start": start, "limit": limit},
+        )
+        assert response is not None, "failed to get connections"
+        return [Connection.from_dict(a) for a in response["userConnections"]]
+
+    async def get_connection(self, display_name: str) -> UserProfile:
+        logger.debug(f"requesting connection for {display_name}")
+        response = await self.connectapi(f"{self.ConnectURL.CONNECTION}/{display_name}")
+        assert response is not None, "failed to get connection"
+        return UserProfile.from_dict(response)
+
+    async def get_connection_activities(
+        self,
+        display_name: str,
+        start: int = 0,
+        limit: int = DEFAULT_PAGE_SIZE,
+    ) -> list[ActivityListItem]:
+        logger.debug(f"requesting activities for connection {display_name}")
+        response = await self.connectapi(
+            self.feed_path(display_name),
+            params={"start": start, "limit": limit},
+        )
+        assert response is not None, "failed to get connection activities"
+        return [ActivityListItem.from_dict(a) for a in response["activityList"]]
+
+    async def get_connection_activities_by_date(
+        self,
+        display_name: str,
+        start_date: date,
+        end_date: date,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> list[ActivityListItem]:
+        """
+        Fetch available activities between specific dates
+        :param display_name: Display name of the user
+        :param start_date: Datetime to be formated as YYYY-MM-DD
+        :param end_date: Datetime to be formated as YYYY-MM-DD
+        :param page_size: (Optional) Number of activities requested at a time
+        """
+        logger.debug(f"requesting activities between {start_date} and {end_date}")
+
+        path = self.feed_path(display_name)
+        params = {"startDate": self.to_garmin_date(start_date), "endDate": self.to_garmin_date(end_date)}
+        key = self.cache.key(path, params)
+        activities = self.cache.get(key)
+        if activities is MISSING:
+            activities = await self._fetch_connection_activities_by_date(path, start_date, end_date, page_size)
+            self.cache.set(key, activities, self.client.range_ttl(path, end_date))
+
+        return [ActivityListItem.from_dict(a) for a in activities]
+
+    async def fetch_activities_range(
+        self,
+        display_name: str,
+        start_date: date,
+        end_date: date | None = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        prefetch: int = PREFETCH_PAGES,
+    ) -> list[dict]:
+        """
+        Same as GarminClient.fetch_activities_range.
+        """
+        if display_name == self.display_name:
+            params = {**self.search_params(start_date, end_date), "limit": str(page_size)}
+            async with aclosing(self._iter_feed_pages(self.ConnectURL.ACTIVITIES, params, prefetch=prefetch)) as pages:
+                return [a async for page in pages for a in page]
+        return await self._fetch_connection_activities_by_date(
+            self.feed_path(display_name), start_date, end_date or date.max, page_size, prefetch
+        )
+
+    async def _fetch_connection_activities_by_date(
+        self,
+        path: str,
+        start_date: date,
+        end_date: date,
+        page_size: int,
+        prefetch: int = 1,
+    ) -> list[dict]:
+        start, first = await self._seek_feed(path, end_date, page_size)
+        collector = RangeCollector(self.offsets, path, start, start_date, end_date, page_size)
+        async with aclosing(self._iter_feed_pages(path, {"limit": page_size}, start, prefetch, first)) as pages:
+            async for page in pages:
+                if collector.add(page):
+                    break
+        return collector.activities
+
+    async def _seek_feed(self, path: str, end_date: date, page_size: int) -> tuple[int, list[dict] | None]:
+        """
+        Same as GarminClient._seek_feed, awaiting each page.
+        """
+        seek = seek_feed(self.offsets, path, end_date, page_size)
+        start = next(seek)
+        while True:
+            try:
+                start = seek.send(await self._fetch_feed_page(path, {"start": start, "limit": page_size}))
+            except StopIteration as e:
+                return e.value
+
+    async def request_reload(self, cdate: str):
+        """
+        Request reload of data for a specific date.
+        This is necessary because Garmin offloads older data.
+        """
+        logger.debug(f"requesting reload of data for {cdate}.")
+        return await self.request("POST", f"{self.ConnectURL.REQUEST_RELOAD}/{cdate}")
+
+
+def _to_garth_error(e: httpx.HTTPStatusError) -> GarthHTTPError:
+    # keep raising the same error type as the sync client so callers don't need to care about the transport
+    response = Response()
+    response.status_code = e.response.status_code
+    response.headers.update(e.response.headers)
+    response.url = str(e.request.url)
+    return GarthHTTPError(msg="Error in request", error=HTTPError(str(e), response=response))
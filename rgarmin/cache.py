@@ -0,0 +1,215 @@
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Protocol
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE = math.inf  # ttl for data that is never going to change upstream
+MISSING = object()
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    stored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_stored_at ON responses (stored_at);
+CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at);
+"""
+
+
+class CacheBackend(Protocol):
+    """
+    Storage of the cached responses, values are the JSON responses sent by Garmin.
+    """
+
+    def __len__(self) -> int: ...
+
+    def get(self, key: str) -> Any: ...
+
+    def set(self, key: str, value: Any, ttl: float): ...
+
+    def invalidate(self, prefix: str) -> int: ...
+
+
+class ResponseCache:
+    """
+    Cache for raw Garmin Connect responses with a per endpoint TTL, stored in memory by default.
+    TTLs are resolved from the policy using the longest endpoint prefix matching the requested path, so a single entry
+    for a ConnectURL covers all the paths built on top of it (e.g. '{ACTIVITIES_BASEURL}/{display_name}').
+    Keys are the path and sorted params prefixed with a namespace, so caches of different accounts can share a backend.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        policy: dict[str, float] | None = None,
+        default_ttl: float = 60,
+        backend: CacheBackend | None = None,
+        namespace: str = "",
+    ):
+        """
+        :param maxsize: Max entries of the default in memory backend
+        :param policy: TTL of each endpoint prefix
+        :param default_ttl: TTL of the endpoints not in the policy
+        :param backend: (Optional) Storage of the entries, a MemoryBackend by default
+        :param namespace: (Optional) Prefix of every key, required when a backend is shared by several accounts (the
+            client adds its login to it)
+        """
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.policy = dict(sorted((policy or {}).items(), key=lambda p: len(p[0]), reverse=True))
+        self.backend = backend if backend is not None else MemoryBackend(maxsize)
+        self.namespace = f"{namespace}:" if namespace else ""
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.backend)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.backend), "maxsize": self.maxsize}
+
+    def key(self, path: str, params: dict | None = None) -> str:
+        return f"{self.namespace}{path}?{urlencode(sorted((params or {}).items()))}"
+
+    def ttl_for(self, path: str) -> float:
+        return next((ttl for prefix, ttl in self.policy.items() if path.startswith(prefix)), self.default_ttl)
+
+    def get(self, key: str) -> Any:
+        """
+        Return the cached value for the key or MISSING if it is not cached or already expired.
+        """
+        value = self.backend.get(key)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        if ttl > 0:
+            self.backend.set(key, value, ttl)
+
+    def invalidate(self, prefix: str | None = None) -> int:
+        """
+        Drop all the entries whose key starts with the given prefix, or the whole cache if no prefix is given.
+        :param prefix: Endpoint path (or full key) of the entries to drop
+        :return: Number of dropped entries
+        """
+        if prefix is not None and not prefix.startswith(self.namespace):
+            prefix = f"{self.namespace}{prefix}"
+        count = self.backend.invalidate(prefix or self.namespace)
+        logger.debug(f"invalidated {count} cache entries")
+        return count
+
+
+class MemoryBackend:
+    """
+    Bounded LRU of the responses of the current process.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, prefix: str) -> int:
+        with self._lock:
+            keys = [k for k in self._entries if k.startswith(prefix)]
+            for k in keys:
+                del self._entries[k]
+        return len(keys)
+
+
+class SQLiteBackend:
+    """
+    Responses stored in a SQLite file shared by every process using it, so several workers (and restarts) reuse the
+    responses fetched by any of them instead of each one requesting its own copy.
+    Expiration uses the wall clock as it is shared between processes, and once there are more than maxsize entries the
+    oldest ones are dropped.
+    Misses are not locked across processes, requests are only single-flighted within each process, so workers missing
+    the same key at once each request it (at most one request per worker, all of them paced by their rate limiters).
+    """
+
+    def __init__(self, path: str = ".garminconnect/cache.sqlite3", maxsize: int = 10_000, trim_every: int = 100):
+        """
+        :param path: SQLite file, shared by every process using the same path
+        :param maxsize: Max entries kept in the file
+        :param trim_every: Writes between two passes dropping the expired and exceeding entries
+        """
+        self.path = path
+        self.maxsize = maxsize
+        self.trim_every = trim_every
+        self._writes = 0
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        # readers of other processes don't block the writer
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SQLITE_SCHEMA)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM responses WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time()),
+            ).fetchone()
+        return MISSING if row is None else json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float):
+        now = time.time()
+        # immutable entries are stored without expiration
+        expires_at = None if math.isinf(ttl) else now + ttl
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, stored_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now),
+            )
+            self._writes += 1
+            if self._writes % self.trim_every == 0:
+                self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                    (self.maxsize,),
+                )
+
+    def invalidate(self, prefix: str) -> int:
+        with self._lock, self._db:
+            cursor = self._db.execute("DELETE FROM responses WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+        return cursor.rowcount
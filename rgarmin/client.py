@@ -1,29 +1,63 @@
+import hashlib
+import json
 import logging
-from datetime import date, datetime
+import os
+import sys
+import tempfile
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
 from enum import StrEnum
 from getpass import getpass
+from typing import Any
 
 import garth as g
 from garth.exc import GarthHTTPError
 
-from pyutils.dicts import camel_to_snake_dict
+from pyutils.shortcuts import week_range_from_date
+from rgarmin.archive import ResponseArchive
+from rgarmin.cache import IMMUTABLE, MISSING, ResponseCache
+from rgarmin.paging import OffsetIndex, RangeCollector, Readahead, feed_page, seek_feed
+from rgarmin.ratelimit import RateLimiter
+from rgarmin.singleflight import SingleFlight
 from rgarmin.types import Activity, ActivityListItem, ActivityType, Connection, DailySummary, UserProfile, UserSettings
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_PAGE_SIZE = 20  # same limit the real Garmin Connect uses
+POOL_SIZE = 20  # max concurrent connections kept alive by the garth session
+PREFETCH_PAGES = 3  # pages requested ahead while the current one is being consumed
+DETAILS_CONCURRENCY = 8  # activity details requested at the same time by get_activities_details
+SNAPSHOT_FILE = "snapshot.json"  # account data kept in the token store so restarts don't have to fetch it again
 
 
 class GarminClient:
     garth: g.Client
-    profile: UserProfile
-    settings: UserSettings
-    _activity_types: list[ActivityType] = []
+    cache: ResponseCache
+    offsets: OffsetIndex
+    limiter: RateLimiter
+    inflight: SingleFlight
+    tokenstore: str
+    archive: ResponseArchive | None
+    replay: bool
 
     @classmethod
     def to_garmin_date(cls, dt: date) -> str:
         return dt.strftime("%Y-%m-%d")
 
+    @property
+    def profile(self) -> UserProfile:
+        if self._profile is None:
+            self._profile = UserProfile.from_dict(self._account_data("profile", self.ConnectURL.CONNECTION))
+        return self._profile
+
+    @property
+    def settings(self) -> UserSettings:
+        if self._settings is None:
+            self._settings = UserSettings.from_dict(self._account_data("settings", self.ConnectURL.USER_SETTINGS))
+        return self._settings
+
     @property
     def display_name(self) -> str:
         return self.profile.display_name
@@ -38,63 +72,286 @@ class GarminClient:
 
     @property
     def activity_types(self) -> list[ActivityType]:
-        if not self._activity_types:
-            response = self.garth.connectapi(self.ConnectURL.ACTIVITY_TYPES)
-            assert response is not None, "failed to get activity types"
+        if self._activity_types is None:
+            response = self._account_data("activity_types", self.ConnectURL.ACTIVITY_TYPES)
             assert all(isinstance(a, dict) for a in response), "invalid activity type data"
-            self._activity_types = [
-                ActivityType.from_dict(a) for a in [camel_to_snake_dict(r) for r in response if isinstance(r, dict)]
-            ]
+            self._activity_types = [ActivityType.from_dict(a) for a in response if isinstance(a, dict)]
         return self._activity_types
 
-    def __init__(self, is_cn=False, tokenstore=".garminconnect"):
+    def __init__(
+        self,
+        is_cn=False,
+        tokenstore=".garminconnect",
+        cache: ResponseCache | None = None,
+        limiter: RateLimiter | None = None,
+        tokens: str | None = None,
+        interactive: bool = True,
+        archive: ResponseArchive | None = None,
+        replay: bool = False,
+    ):
+        """
+        Only the tokens are loaded here, the profile, settings and activity types are loaded from the snapshot of the
+        token store or fetched the first time they are used.
+        When replaying, every response comes from the archive and no login is needed.
+        :param is_cn: Use the Chinese Garmin domain
+        :param tokenstore: Directory of the OAuth tokens
+        :param cache: (Optional) Response cache, a new one by default
+        :param limiter: (Optional) Rate limiter, a new one by default
+        :param tokens: (Optional) Tokens as dumped by garth, used to bootstrap an empty token store
+        :param interactive: Ask for the credentials when there are no tokens, only when running in a terminal
+        :param archive: (Optional) Archive where the responses received from Garmin are recorded
+        :param replay: Serve the responses from the archive instead of requesting Garmin
+        """
+        assert archive is not None or not replay, "replaying requires an archive"
+        self.tokenstore = tokenstore
+        self.archive = archive
+        self.replay = replay
+        self.cache = cache if cache is not None else ResponseCache(policy=self.CACHE_POLICY)
+        self.offsets = OffsetIndex()
+        self.limiter = limiter or RateLimiter()
+        self.inflight = SingleFlight()
         self.garth = g.Client(
             domain="garmin.cn" if is_cn else "garmin.com",
-            pool_connections=20,
-            pool_maxsize=20,
+            pool_connections=POOL_SIZE,
+            pool_maxsize=POOL_SIZE,
         )
-
+        # retryable statuses are handled by the rate limiter so every request backs off together, garth's constructor
+        # already passes its own status_forcelist so it can only be replaced afterwards
+        self.garth.configure(status_forcelist=())
+
+        if not replay:
+            self._login(tokens, interactive)
+            if self.cache.namespace:
+                # shared entries belong to the login, another user logged in the same token store never reads them
+                self.cache.namespace = f"{self.cache.namespace}{self._token_id()}:"
+
+        self._profile: UserProfile | None = None
+        self._settings: UserSettings | None = None
+        self._activity_types: list[ActivityType] | None = None
+        # replays don't belong to the login of the token store, so its snapshot is neither used nor overwritten
+        self._snapshot = {} if replay else self._load_snapshot()
+
+    def _login(self, tokens: str | None, interactive: bool):
         try:
-            self.garth.load(tokenstore)
+            self.garth.load(self.tokenstore)
+            return
         except (FileNotFoundError, GarthHTTPError):
-            logger.error(f"token store not found: {tokenstore}")
-
+            logger.error(f"token store not found: {self.tokenstore}")
+        except json.JSONDecodeError:
+            # a token file left half written, the tokens are taken from the other sources as if there were none
+            logger.error(f"corrupt token store: {self.tokenstore}")
+
+        if tokens:
+            self.garth.loads(tokens)
+        elif interactive and sys.stdin.isatty():
             email = input("Login e-mail: ")
             password = getpass("Enter password: ")
             self.garth.login(email, password)
+        else:
+            raise FileNotFoundError(f"token store not found: {self.tokenstore}")
 
-            # save Oauth1 and Oauth2 token files to directory for next login
-            self.garth.dump(tokenstore)
+        # save Oauth1 and Oauth2 token files to directory for next login
+        self.dump_tokens()
 
-        self.profile = UserProfile.from_dict(camel_to_snake_dict(self.garth.profile))
-        self.settings = UserSettings.get(self.garth)
-        logger.info(f"logged in as {self.display_name}")
+    def dump_tokens(self):
+        """
+        Save the tokens in the token store, each file is replaced at once so concurrent logins never read half a token.
+        """
+        path = os.path.expanduser(self.tokenstore)
+        os.makedirs(path, exist_ok=True)
+        # written aside by garth and renamed, the temporary directory is in the store so renames stay atomic
+        with tempfile.TemporaryDirectory(dir=path) as tmp:
+            self.garth.dump(tmp)
+            for name in os.listdir(tmp):
+                os.replace(os.path.join(tmp, name), os.path.join(path, name))
+
+    def set_account_data(self, profile: dict, settings: dict, activity_types: list[dict]):
+        """
+        Replace the profile, settings and activity types with the given Garmin payloads and save them in the snapshot.
+        """
+        self._profile = UserProfile.from_dict(profile)
+        self._settings = UserSettings.from_dict(settings)
+        self._activity_types = [ActivityType.from_dict(a) for a in activity_types]
+        self._snapshot.update(profile=profile, settings=settings, activity_types=activity_types)
+        self._save_snapshot()
+        logger.info(f"loaded the account data of {self.display_name}")
+
+    def has_account_data(self) -> bool:
+        return all(k in self._snapshot for k in ("profile", "settings", "activity_types"))
+
+    def _account_data(self, key: str, path: str) -> Any:
+        if key not in self._snapshot:
+            response = self.connectapi(path)
+            assert response is not None, f"failed to get {key}"
+            self._snapshot[key] = response
+            self._save_snapshot()
+        return self._snapshot[key]
+
+    def _load_snapshot(self) -> dict[str, Any]:
+        try:
+            with open(os.path.join(os.path.expanduser(self.tokenstore), SNAPSHOT_FILE)) as file:
+                snapshot = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"token": self._token_id()}
+        # snapshots of a different login are ignored
+        return snapshot if snapshot.get("token") == self._token_id() else {"token": self._token_id()}
+
+    def _save_snapshot(self):
+        if self.replay:
+            return
+        path = os.path.join(os.path.expanduser(self.tokenstore), SNAPSHOT_FILE)
+        try:
+            # written aside and renamed so a concurrent reader never sees half a file, each writer has its own file as
+            # every worker logged in with the same token store saves the snapshot
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{SNAPSHOT_FILE}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as file:
+                    json.dump(self._snapshot, file)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError as e:
+            logger.warning(f"couldn't save the account snapshot: {e}")
+
+    def _token_id(self) -> str:
+        token = self.garth.oauth1_token.oauth_token if self.garth.oauth1_token else ""
+        return hashlib.sha1(token.encode()).hexdigest()
+
+    def connectapi(self, path: str, params: dict | None = None, ttl: float | None = None) -> Any:
+        """
+        GET the given Garmin Connect path going through the response cache.
+        Concurrent calls for the same path and params share a single upstream request.
+        :param path: Endpoint path
+        :param params: (Optional) Query params
+        :param ttl: (Optional) Overrides the cache policy for this response, 0 skips caching
+        """
+        key = self.cache.key(path, params)
+        response = self.cache.get(key)
+        if response is MISSING:
+
+            def fetch() -> Any:
+                response = self._fetch(path, params)
+                self.cache.set(key, response, self.cache.ttl_for(path) if ttl is None else ttl)
+                return response
+
+            response = self.inflight.do(key, fetch)
+        return response
+
+    def _fetch(self, path: str, params: dict | None) -> Any:
+        if self.replay:
+            return self.archived(path, params)
+        response = self._request(lambda: self.garth.connectapi(path, params=params))
+        if self.archive is not None:
+            self.archive.record(path, params, response)
+        return response
+
+    def archived(self, path: str, params: dict | None = None) -> Any:
+        """
+        Return the last response recorded in the archive for the path and params, None if it was never recorded.
+        """
+        assert self.archive is not None, "no archive to replay"
+        response = self.archive.get(path, params)
+        if response is MISSING:
+            logger.warning(f"no archived response for {self.archive.key(path, params)}")
+            return None
+        return response
+
+    def _request(self, send: Callable[[], Any], idempotent: bool = True) -> Any:
+        """
+        Send a request through the rate limiter, retrying it while the limiter allows it.
+        :param send: Sends the request and returns its response
+        :param idempotent: Whether the request can be sent again after a server error
+        """
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                result = send()
+            except GarthHTTPError as e:
+                response = e.error.response
+                if response is None or not self.limiter.should_retry(
+                    response.status_code, attempt, response.headers.get("Retry-After"), idempotent
+                ):
+                    raise
+                attempt += 1
+                continue
+            self.limiter.success()
+            return result
+
+    def range_ttl(self, path: str, end_date: date) -> float:
+        """
+        Activities of weeks fully in the past are not going to change, so they can be cached forever.
+        """
+        return IMMUTABLE if end_date < week_range_from_date(date.today())[0] else self.cache.ttl_for(path)
 
     def get_user_summary(self, cdate: str, display_name: str | None = None) -> DailySummary:
         logger.debug("requesting user summary")
-        response = self.garth.connectapi(
+        response = self.connectapi(
             f"{self.ConnectURL.DAILY_SUMMARY}/{display_name or self.display_name}",
             params={"calendarDate": str(cdate)},
         )
         assert response is not None, "failed to get user summary"
         assert not response["privacyProtected"], "user summary is private"
-        return DailySummary.from_dict(camel_to_snake_dict(response))
+        return DailySummary.from_dict(response)
 
     def get_activities(self, start: int = 0, limit: int = DEFAULT_PAGE_SIZE) -> list[ActivityListItem]:
         logger.debug("requesting activities")
-        response = self.garth.connectapi(
+        response = self.connectapi(
             self.ConnectURL.ACTIVITIES,
             params={"start": start, "limit": limit},
         )
         assert response is not None, "failed to get activities"
         assert all(isinstance(a, dict) for a in response), "invalid activity data"
-        return [ActivityListItem.from_dict(camel_to_snake_dict(a)) for a in response if isinstance(a, dict)]
+        return [ActivityListItem.from_dict(a) for a in response if isinstance(a, dict)]
 
     def get_activity(self, activity_id: str) -> Activity:
         logger.debug(f"Requesting activity summary data for activity id {activity_id}")
-        response = self.garth.connectapi(f"{self.ConnectURL.ACTIVITY}/{activity_id}")
+        response = self.connectapi(f"{self.ConnectURL.ACTIVITY}/{activity_id}")
         assert response is not None, "failed to get activity"
-        return Activity.from_dict(camel_to_snake_dict(response))
+        return Activity.from_dict(response)
+
+    def get_activities_details(
+        self,
+        activity_ids: Iterable[int | str],
+        concurrency: int = DETAILS_CONCURRENCY,
+    ) -> tuple[dict[int | str, Activity], dict[int | str, GarthHTTPError]]:
+        """
+        Fetch the details of several activities concurrently.
+        :param activity_ids: Ids of the activities, repeated ids are only requested once
+        :param concurrency: Max requests in flight, bounded by the session pool size
+        :return: The activities that could be fetched and the error of each one that failed, both keyed by the given ids
+        """
+        activity_ids = list(dict.fromkeys(activity_ids))
+        if not activity_ids:
+            return {}, {}
+
+        workers = max(1, min(concurrency, POOL_SIZE, len(activity_ids)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(self.get_activity, str(i)) for i in activity_ids]
+            results = [f.exception() or f.result() for f in futures]
+        return self.split_details(activity_ids, results)
+
+    @staticmethod
+    def split_details(
+        activity_ids: list[int | str],
+        results: list[Activity | BaseException],
+    ) -> tuple[dict[int | str, Activity], dict[int | str, GarthHTTPError]]:
+        """
+        Split the results of get_activities_details in the fetched activities and the errors of the ones that failed.
+        Only Garmin errors are reported, anything else is raised.
+        """
+        activities: dict[int | str, Activity] = {}
+        errors: dict[int | str, GarthHTTPError] = {}
+        for activity_id, result in zip(activity_ids, results):
+            if isinstance(result, GarthHTTPError):
+                logger.error(f"Error fetching activity {activity_id}: {result}")
+                errors[activity_id] = result
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                activities[activity_id] = result
+        return activities, errors
 
     def get_activities_by_date(
         self,
@@ -108,49 +365,119 @@ class GarminClient:
         :param enddate: (Optional) Datetime to be formated as YYYY-MM-DD
         :param activity_type: (Optional) Type of activity you are searching
         """
+        return list(self.iter_activities_by_date(start_date, end_date, activity_type))
+
+    def iter_activities_by_date(
+        self,
+        start_date: date,
+        end_date: date,
+        activity_type: str | None = None,
+        prefetch: int = PREFETCH_PAGES,
+    ) -> Iterator[ActivityListItem]:
+        """
+        Stream available activities between specific dates as their pages arrive
+        :param start_date: Datetime to be formated as YYYY-MM-DD
+        :param enddate: (Optional) Datetime to be formated as YYYY-MM-DD
+        :param activity_type: (Optional) Type of activity you are searching
+        :param prefetch: (Optional) Number of pages requested ahead in parallel, at least 1
+        """
         logger.debug(f"requesting activities between {start_date} and {end_date}")
 
+        params = self.search_params(start_date, end_date, activity_type)
+        key = self.cache.key(self.ConnectURL.ACTIVITIES, params)
+        activities = self.cache.get(key)
+        if activities is not MISSING:
+            yield from [ActivityListItem.from_dict(a) for a in activities]
+            return
+
         activities = []
-        start = 0
+        for page in self._iter_feed_pages(self.ConnectURL.ACTIVITIES, params, prefetch=prefetch):
+            activities.extend(page)
+            yield from [ActivityListItem.from_dict(a) for a in page]
+
+        if end_date:
+            self.cache.set(key, activities, self.range_ttl(self.ConnectURL.ACTIVITIES, end_date))
 
-        # mimicking the behavior of the web interface that fetches 20 activities at a time and loads more on scroll
+    @classmethod
+    def search_params(cls, start_date: date, end_date: date | None, activity_type: str | None = None) -> dict:
+        """
+        Query params of the pages of the search endpoint between both days, without their offset.
+        """
         params = {
-            "startDate": self.to_garmin_date(start_date),
-            "start": str(start),
+            "startDate": cls.to_garmin_date(start_date),
             "limit": str(DEFAULT_PAGE_SIZE),
         }
         if end_date:
-            params["endDate"] = self.to_garmin_date(end_date)
+            params["endDate"] = cls.to_garmin_date(end_date)
         if activity_type:
             params["activityType"] = str(activity_type)
+        return params
 
-        while True:
-            logger.debug(f"requesting activities {start} to {start + DEFAULT_PAGE_SIZE}")
-            params["start"] = str(start)
-            response = self.garth.connectapi(self.ConnectURL.ACTIVITIES, params=params)
-            if not response:
-                break
-            activities.extend(
-                [ActivityListItem.from_dict(camel_to_snake_dict(a)) for a in response if isinstance(a, dict)]
-            )
-            start = start + DEFAULT_PAGE_SIZE
+    @classmethod
+    def feed_path(cls, display_name: str) -> str:
+        return f"{cls.ConnectURL.ACTIVITIES_BASEURL}/{display_name}"
 
-        return activities
+    def _iter_feed_pages(
+        self,
+        path: str,
+        params: dict,
+        start: int = 0,
+        prefetch: int = 1,
+        first: list[dict] | None = None,
+    ) -> Iterator[list[dict]]:
+        """
+        Yield the pages of a feed in order while the next ones are already being requested.
+        A short page means there is nothing after it, so the speculative requests past it are dropped.
+        :param path: Path of the feed
+        :param params: Query params of every page, besides their offset
+        :param start: Offset of the first page
+        :param prefetch: Largest number of pages requested ahead in parallel (see Readahead), at least 1
+        :param first: (Optional) First page, when it was already fetched
+        """
+        page_size = int(params["limit"])
+        if first is not None:
+            yield first
+            if len(first) < page_size:
+                return
+            start = start + page_size
+
+        def fetch(offset: int) -> list[dict]:
+            return self._fetch_feed_page(path, {**params, "start": offset})
+
+        readahead = Readahead(start, page_size, prefetch)
+        with ThreadPoolExecutor(max_workers=readahead.limit) as executor:
+            pending = deque(executor.submit(fetch, offset) for offset in readahead.offsets(0))
+            try:
+                while pending:
+                    page = pending.popleft().result()
+                    yield page
+                    if len(page) < page_size:
+                        break
+                    readahead.grow()
+                    pending.extend(executor.submit(fetch, offset) for offset in readahead.offsets(len(pending)))
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _fetch_feed_page(self, path: str, params: dict) -> list[dict]:
+        logger.debug(f"requesting activities {params['start']} to {int(params['start']) + int(params['limit'])}")
+        # offsets move as soon as a new activity is uploaded so pages are not worth caching
+        return feed_page(self.connectapi(path, params=params, ttl=0))
 
     def get_connections(self, start: int = 0, limit: int = DEFAULT_PAGE_SIZE) -> list[Connection]:
         logger.debug("requesting connections")
-        response = self.garth.connectapi(
+        response = self.connectapi(
             self.ConnectURL.CONNECTIONS,
             params={"start": start, "limit": limit},
         )
         assert response is not None, "failed to get connections"
-        return [Connection.from_dict(a) for a in camel_to_snake_dict(response)["user_connections"]]
+        return [Connection.from_dict(a) for a in response["userConnections"]]
 
     def get_connection(self, display_name: str) -> UserProfile:
         logger.debug(f"requesting connection for {display_name}")
-        response = self.garth.connectapi(f"{self.ConnectURL.CONNECTION}/{display_name}")
+        response = self.connectapi(f"{self.ConnectURL.CONNECTION}/{display_name}")
         assert response is not None, "failed to get connection"
-        return UserProfile.from_dict(camel_to_snake_dict(response))
+        return UserProfile.from_dict(response)
 
     def get_connection_activities(
         self,
@@ -159,50 +486,93 @@ class GarminClient:
         limit: int = DEFAULT_PAGE_SIZE,
     ) -> list[ActivityListItem]:
         logger.debug(f"requesting activities for connection {display_name}")
-        response = self.garth.connectapi(
-            f"{self.ConnectURL.ACTIVITIES_BASEURL}/{display_name}",
+        response = self.connectapi(
+            self.feed_path(display_name),
             params={"start": start, "limit": limit},
         )
         assert response is not None, "failed to get connection activities"
-        return [ActivityListItem.from_dict(a) for a in camel_to_snake_dict(response)["activity_list"]]
+        return [ActivityListItem.from_dict(a) for a in response["activityList"]]
 
     def get_connection_activities_by_date(
         self,
         display_name: str,
         start_date: date,
         end_date: date,
+        page_size: int = DEFAULT_PAGE_SIZE,
     ) -> list[ActivityListItem]:
         """
         Fetch available activities between specific dates
         :param display_name: Display name of the user
         :param start_date: Datetime to be formated as YYYY-MM-DD
         :param end_date: Datetime to be formated as YYYY-MM-DD
+        :param page_size: (Optional) Number of activities requested at a time
         """
         logger.debug(f"requesting activities between {start_date} and {end_date}")
 
-        activities = []
-        start = 0
+        path = self.feed_path(display_name)
+        params = {"startDate": self.to_garmin_date(start_date), "endDate": self.to_garmin_date(end_date)}
+        key = self.cache.key(path, params)
+        activities = self.cache.get(key)
+        if activities is MISSING:
+            activities = self._fetch_connection_activities_by_date(path, start_date, end_date, page_size)
+            self.cache.set(key, activities, self.range_ttl(path, end_date))
 
-        # mimicking the behavior of the web interface that fetches 20 activities at a time and loads more on scroll
-        while True:
-            logger.debug(f"requesting activities {start} to {start + DEFAULT_PAGE_SIZE}")
-            response = self.garth.connectapi(
-                f"{self.ConnectURL.ACTIVITIES_BASEURL}/{display_name}",
-                params={"start": start, "limit": DEFAULT_PAGE_SIZE},
-            )
-            assert response is not None, "failed to get connection activities"
+        return [ActivityListItem.from_dict(a) for a in activities]
 
-            activity_list = response.get("activityList", [])
-            if not activity_list:
-                return activities
+    def fetch_activities_range(
+        self,
+        display_name: str,
+        start_date: date,
+        end_date: date | None = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        prefetch: int = PREFETCH_PAGES,
+    ) -> list[dict]:
+        """
+        Fetch the payloads of the activities of the user or of a connection between both days straight from Garmin.
+        The search endpoint filters the activities of the user by itself, while the feeds of connections are seeked to
+        the last day first, so old ranges don't need to walk every newer page.
+        :param display_name: Display name of the user or connection
+        :param start_date: First day of the range
+        :param end_date: (Optional) Last day of the range, up to the newest activity by default
+        :param page_size: (Optional) Number of activities requested at a time
+        :param prefetch: (Optional) Largest number of pages requested ahead in parallel, at least 1
+        """
+        if display_name == self.display_name:
+            params = {**self.search_params(start_date, end_date), "limit": str(page_size)}
+            pages = self._iter_feed_pages(self.ConnectURL.ACTIVITIES, params, prefetch=prefetch)
+            return [a for page in pages for a in page]
+        return self._fetch_connection_activities_by_date(
+            self.feed_path(display_name), start_date, end_date or date.max, page_size, prefetch
+        )
 
-            for a in activity_list:
-                if datetime.fromisoformat(a["startTimeLocal"]).date() < start_date:
-                    return activities
-                if datetime.fromisoformat(a["startTimeLocal"]).date() <= end_date:
-                    activities.append(ActivityListItem.from_dict(camel_to_snake_dict(a)))
+    def _fetch_connection_activities_by_date(
+        self,
+        path: str,
+        start_date: date,
+        end_date: date,
+        page_size: int,
+        prefetch: int = 1,
+    ) -> list[dict]:
+        start, first = self._seek_feed(path, end_date, page_size)
+        collector = RangeCollector(self.offsets, path, start, start_date, end_date, page_size)
+        # from there on, walk the pages like the web interface does until the range is left behind
+        for page in self._iter_feed_pages(path, {"limit": page_size}, start, prefetch, first):
+            if collector.add(page):
+                break
+        return collector.activities
 
-            start = start + DEFAULT_PAGE_SIZE
+    def _seek_feed(self, path: str, end_date: date, page_size: int) -> tuple[int, list[dict] | None]:
+        """
+        Find the offset of the newest activity on or before end_date so old weeks don't need to walk every page.
+        :return: The offset and the page starting at it when it was already fetched while searching
+        """
+        seek = seek_feed(self.offsets, path, end_date, page_size)
+        start = next(seek)
+        while True:
+            try:
+                start = seek.send(self._fetch_feed_page(path, {"start": start, "limit": page_size}))
+            except StopIteration as e:
+                return e.value
 
     def request_reload(self, cdate: str):
         """
@@ -211,7 +581,7 @@ class GarminClient:
         """
         logger.debug(f"requesting reload of data for {cdate}.")
         url = f"{self.ConnectURL.REQUEST_RELOAD}/{cdate}"
-        return self.garth.post("connectapi", url, api=True)
+        return self._request(lambda: self.garth.post("connectapi", url, api=True), idempotent=False)
 
     class ConnectURL(StrEnum):
         ACTIVITY_TYPES = "/activity-service/activity/activityTypes"
@@ -222,6 +592,7 @@ class GarminClient:
         CONNECTIONS_BASEURL = "/connection-service/connection/"
         CONNECTIONS = "connection-service/connection/connections"
         CONNECTION = "/userprofile-service/socialProfile"
+        USER_SETTINGS = "/userprofile-service/userprofile/user-settings"
         REQUEST_RELOAD = "/wellness-service/wellness/epoch/request"
 
         DEVICES = "/device-service/deviceregistration/devices"
@@ -280,3 +651,14 @@ class GarminClient:
         WORKOUTS = "/workout-service"
         DELETE_ACTIVITY = "/activity-service/activity"
         GRAPHQL_ENDPOINT = "graphql-gateway/graphql"
+
+    # seconds each endpoint response is kept in the cache, matched by path prefix
+    CACHE_POLICY: dict[str, float] = {
+        ConnectURL.ACTIVITY_TYPES: timedelta(days=1).total_seconds(),
+        ConnectURL.ACTIVITY: IMMUTABLE,  # details are only available once the activity has finished
+        ConnectURL.ACTIVITIES: timedelta(minutes=1).total_seconds(),
+        ConnectURL.ACTIVITIES_BASEURL: timedelta(minutes=1).total_seconds(),
+        ConnectURL.CONNECTIONS: timedelta(minutes=5).total_seconds(),
+        ConnectURL.CONNECTION: timedelta(hours=1).total_seconds(),
+        ConnectURL.DAILY_SUMMARY: timedelta(minutes=5).total_seconds(),
+    }
@@ -1,4 +1,6 @@
-from datetime import datetime
+from datetime import date, datetime
+
+from rgarmin.types.activity import WEEKDAYS
 
 
 def translate(text: str) -> str:
@@ -31,10 +33,21 @@ def translate(text: str) -> str:
         return "Siguiente"
     elif text == "_error_fetching_activities":
         return "Error recuperando actividades"
+    elif text == "_unknown_connection":
+        return "Conexión desconocida"
     else:
         return "Otros"
 
 
+def format_date(d: date) -> str:
+    return d.strftime("%d-%m-%Y")
+
+
+def format_weekday(d: date) -> str:
+    # English names, as expected by translate
+    return WEEKDAYS[d.weekday()]
+
+
 def format_datetime(d: datetime) -> str:
     return d.strftime("%d-%m-%Y %H:%M:%S")
 
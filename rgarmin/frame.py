@@ -0,0 +1,255 @@
+import logging
+from collections.abc import Iterable, Sequence
+from datetime import date
+
+import numpy as np
+
+from rgarmin.types import Activity, ActivityListItem
+from rgarmin.types.activity import Summary
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_FIELDS = (
+    "distance",
+    "duration",
+    "elapsed_duration",
+    "moving_duration",
+    "average_speed",
+    "max_speed",
+    "average_hr",
+    "max_hr",
+    "aerobic_training_effect",
+    "anaerobic_training_effect",
+    "activity_training_load",
+    "hr_time_in_zone_1",
+    "hr_time_in_zone_2",
+    "hr_time_in_zone_3",
+    "hr_time_in_zone_4",
+    "hr_time_in_zone_5",
+    "avg_stride_length",
+    "total_sets",
+    "total_reps",
+    "active_sets",
+)
+GROUP_KEYS = ("owner", "week", "type_key")
+AGGREGATIONS = ("sum", "mean", "min", "max")
+
+# numpy days are counted from 1970-01-01, which was a Thursday
+_EPOCH_WEEKDAY = 3
+
+
+class ActivityFrame:
+    """
+    Columnar table of activities for bulk analytics.
+    Each numeric field is stored as a float64 array together with a boolean mask of the activities that have a value
+    for it, so aggregates are computed with vectorized numpy operations instead of Python loops over the activities.
+    Owners and activity types are stored as integer codes into their list of distinct values.
+    """
+
+    def __init__(
+        self,
+        activity_ids: np.ndarray,
+        days: np.ndarray,
+        codes: dict[str, np.ndarray],
+        labels: dict[str, np.ndarray],
+        values: dict[str, np.ndarray],
+        valid: dict[str, np.ndarray],
+    ):
+        """
+        :param activity_ids: Activity id of each row
+        :param days: Local start day of each row as datetime64[D]
+        :param codes: Code of the 'owner' and 'type_key' of each row
+        :param labels: Distinct values of 'owner' and 'type_key' indexed by their code
+        :param values: float64 values of each numeric field, 0 where the activity has no value
+        :param valid: Mask of the rows that have a value for each numeric field
+        """
+        self.activity_ids = activity_ids
+        self.days = days
+        self.codes = codes
+        self.labels = labels
+        self.values = values
+        self.valid = valid
+
+    def __len__(self) -> int:
+        return len(self.activity_ids)
+
+    @property
+    def owners(self) -> np.ndarray:
+        return self.labels["owner"][self.codes["owner"]]
+
+    @property
+    def type_keys(self) -> np.ndarray:
+        return self.labels["type_key"][self.codes["type_key"]]
+
+    @classmethod
+    def from_activities(cls, activities: Iterable[ActivityListItem | Activity], owner: str = "") -> "ActivityFrame":
+        """
+        Build a frame from the activities of a single athlete.
+        For Activity items the numeric fields are read from their summary, fields it doesn't have are left empty.
+        :param activities: ActivityListItem or Activity items
+        :param owner: Display name of the athlete the activities belong to
+        """
+        return cls.from_owners({owner: activities})
+
+    @classmethod
+    def from_owners(cls, activities: dict[str, Iterable[ActivityListItem | Activity]]) -> "ActivityFrame":
+        """
+        Build a frame from the activities of several athletes.
+        :param activities: Activities of each athlete by display name
+        """
+        items, owner_codes = [], []
+        for code, owner_items in enumerate(activities.values()):
+            size = len(items)
+            items.extend(owner_items)
+            owner_codes.append(np.full(len(items) - size, code, dtype=np.int64))
+        details = [item.summary if isinstance(item, Activity) else item for item in items]
+
+        type_labels: dict[str, int] = {}
+        type_codes = [type_labels.setdefault(item.activity_type.type_key, len(type_labels)) for item in items]
+
+        values, valid = {}, {}
+        for name in NUMERIC_FIELDS:
+            # missing values are converted to NaN by numpy
+            column = np.array([getattr(d, name, None) for d in details], dtype=np.float64)
+            valid[name] = ~np.isnan(column)
+            values[name] = np.where(valid[name], column, 0.0)
+
+        return cls(
+            activity_ids=np.fromiter((item.activity_id for item in items), dtype=np.int64, count=len(items)),
+            days=np.array([_start_day(d) for d in details], dtype="datetime64[D]"),
+            codes={
+                "owner": np.concatenate(owner_codes) if owner_codes else np.zeros(0, dtype=np.int64),
+                "type_key": np.array(type_codes, dtype=np.int64),
+            },
+            labels={
+                "owner": np.array(list(activities.keys()), dtype=object),
+                "type_key": np.array(list(type_labels.keys()), dtype=object),
+            },
+            values=values,
+            valid=valid,
+        )
+
+    @classmethod
+    def concat(cls, frames: Sequence["ActivityFrame"]) -> "ActivityFrame":
+        if not frames:
+            return cls.from_owners({})
+
+        codes, labels = {}, {}
+        for key in ("owner", "type_key"):
+            labels[key], inverse = np.unique(np.concatenate([f.labels[key] for f in frames]), return_inverse=True)
+            # remap the codes of each frame to the merged labels
+            offsets = np.cumsum([0] + [len(f.labels[key]) for f in frames])
+            codes[key] = np.concatenate([inverse[o + f.codes[key]] for o, f in zip(offsets, frames)])
+
+        return cls(
+            activity_ids=np.concatenate([f.activity_ids for f in frames]),
+            days=np.concatenate([f.days for f in frames]),
+            codes=codes,
+            labels=labels,
+            values={n: np.concatenate([f.values[n] for f in frames]) for n in NUMERIC_FIELDS},
+            valid={n: np.concatenate([f.valid[n] for f in frames]) for n in NUMERIC_FIELDS},
+        )
+
+    def select(self, mask: np.ndarray) -> "ActivityFrame":
+        """
+        :param mask: Boolean mask or indices of the rows to keep
+        :return: A new frame with only the selected rows
+        """
+        return ActivityFrame(
+            activity_ids=self.activity_ids[mask],
+            days=self.days[mask],
+            codes={k: v[mask] for k, v in self.codes.items()},
+            labels=self.labels,
+            values={n: v[mask] for n, v in self.values.items()},
+            valid={n: v[mask] for n, v in self.valid.items()},
+        )
+
+    def between(self, start_date: date, end_date: date) -> "ActivityFrame":
+        """
+        :return: A new frame with the activities started between both days, inclusive
+        """
+        start, end = np.datetime64(start_date, "D"), np.datetime64(end_date, "D")
+        return self.select((self.days >= start) & (self.days <= end))
+
+    def weeks(self, first_weekday: int = 0) -> np.ndarray:
+        """
+        :param first_weekday: First day of the week, 0 is Monday and 6 is Sunday
+        :return: The first day of the week of each row as datetime64[D]
+        """
+        days = self.days.astype(np.int64)
+        return self.days - ((days + _EPOCH_WEEKDAY - first_weekday) % 7).astype("timedelta64[D]")
+
+    def total(self, name: str) -> float:
+        return float(self.values[name].sum())
+
+    def group_by(
+        self,
+        by: str | Sequence[str],
+        fields: Sequence[str] = NUMERIC_FIELDS,
+        how: str = "sum",
+        first_weekday: int = 0,
+    ) -> dict[tuple, dict[str, float | int | None]]:
+        """
+        Aggregate numeric fields over groups of activities. Rows without a value for a field are ignored for that field,
+        and groups without any value get None.
+        :param by: Keys to group by, any of 'owner', 'week' or 'type_key'
+        :param fields: Numeric fields to aggregate
+        :param how: Aggregation, one of 'sum', 'mean', 'min' or 'max'
+        :param first_weekday: First day of the week used for the 'week' key, 0 is Monday and 6 is Sunday
+        :return: The number of activities in "count" and the aggregated fields of each group, keyed by a tuple with the
+            values of the grouping keys, weeks are given as the date they start
+        """
+        by = (by,) if isinstance(by, str) else tuple(by)
+        if unknown := set(by) - set(GROUP_KEYS):
+            raise ValueError(f"unknown group keys {unknown}, expected any of {GROUP_KEYS}")
+        if how not in AGGREGATIONS:
+            raise ValueError(f"unknown aggregation {how}, expected one of {AGGREGATIONS}")
+        if not len(self):
+            return {}
+
+        # combine the codes of each key into a single mixed radix group code
+        codes, labels = [], []
+        combined = np.zeros(len(self), dtype=np.int64)
+        for key in by:
+            if key == "week":
+                weeks = self.weeks(first_weekday)
+                first = weeks.min()
+                code = (weeks - first).astype(np.int64) // 7
+                label = first + np.arange(code.max() + 1) * np.timedelta64(7, "D")
+            else:
+                code, label = self.codes[key], self.labels[key]
+            combined = combined * len(label) + code
+            codes.append(code)
+            labels.append(label)
+        groups, inverse = np.unique(combined, return_inverse=True)
+        size = len(groups)
+
+        columns = [np.bincount(inverse, minlength=size).tolist()]
+        for name in fields:
+            values, valid = self.values[name], self.valid[name]
+            counts = np.bincount(inverse, weights=valid, minlength=size)
+            if how in ("sum", "mean"):
+                result = np.bincount(inverse, weights=values, minlength=size)
+                if how == "mean":
+                    result = np.divide(result, counts, out=np.zeros(size), where=counts > 0)
+            else:
+                fill, ufunc = (np.inf, np.minimum) if how == "min" else (-np.inf, np.maximum)
+                result = np.full(size, fill)
+                ufunc.at(result, inverse[valid], values[valid])
+            columns.append(np.where(counts > 0, result.astype(object), None).tolist())
+
+        # split the group codes back into the label of each key
+        keys = []
+        for label in reversed(labels):
+            groups, code = np.divmod(groups, len(label))
+            keys.insert(0, label[code].tolist())
+
+        names = ["count", *fields]
+        rows = zip(*keys) if keys else [()]
+        return {key: dict(zip(names, row)) for key, *row in zip(rows, *columns)}
+
+
+def _start_day(details: ActivityListItem | Summary) -> date | str:
+    start = details.start_time_local
+    # Summary keeps the start time as sent by Garmin
+    return start.date() if not isinstance(start, str) else start[:10]
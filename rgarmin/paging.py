@@ -0,0 +1,199 @@
+import logging
+import threading
+from collections.abc import Generator
+from datetime import date, datetime
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class OffsetIndex:
+    """
+    Remembers the day of the activities seen at some offsets of each newest first activity feed.
+    New uploads only push older activities to higher offsets, so the offset of an activity newer than a given day is
+    still a lower bound for the offset of that day, even after the feed changed.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._offsets: dict[str, dict[int, date]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, feed: str, offset: int, day: date):
+        with self._lock:
+            offsets = self._offsets.setdefault(feed, {})
+            offsets[offset] = day
+            if len(offsets) > self.maxsize:
+                del offsets[next(iter(offsets))]
+
+    def add_page(self, feed: str, start: int, days: list[date]):
+        """
+        Remember the last activity of a page, the oldest one, which bounds the offsets of every older day.
+        """
+        if days:
+            self.add(feed, start + len(days) - 1, days[-1])
+
+    def lower_bound(self, feed: str, end_date: date) -> int:
+        """
+        :return: Highest known offset of an activity newer than end_date, or -1 if there is none.
+        """
+        with self._lock:
+            offsets = self._offsets.get(feed, {})
+            return max((o for o, d in offsets.items() if d > end_date), default=-1)
+
+
+def seek_offset(end_date: date, lower_bound: int, page_size: int) -> Generator[int, list[date], int]:
+    """
+    Find the offset of the newest activity on or before end_date in a newest first feed.
+    Pages are galloped from the lower bound doubling the jump each time and the last jump is binary searched, so old
+    weeks are reached in O(log pages) requests. The generator yields the offsets of the pages it needs and expects the
+    days of the activities in each page to be sent back, which keeps the search independent of the client doing IO.
+    :param end_date: Last day of the searched range
+    :param lower_bound: Known offset of an activity newer than end_date, -1 if none
+    :param page_size: Number of activities in each page
+    :return: Offset of the first activity on or before end_date, or the length of the feed if there is none
+    """
+    lo, k, step = -1, max(lower_bound, 0), page_size
+    while True:
+        days = yield k
+        i = next((i for i, d in enumerate(days) if d <= end_date), None)
+        if i is None and len(days) == page_size:
+            lo = k + len(days) - 1
+            k, step = lo + 1 + step, step * 2
+            continue
+        if i is None and days:
+            # the feed ends before reaching end_date
+            return k + len(days)
+        if i or k == 0:
+            return k + (i or 0)
+        if k == lower_bound:
+            # the hinted activity is not where it was (e.g. deleted activities), search from the start
+            logger.debug(f"discarding stale offset hint {lower_bound}")
+            lo = -1
+        hi = k
+        break
+
+    while hi - lo > 1:
+        k = (lo + hi + 1) // 2
+        days = yield k
+        i = next((i for i, d in enumerate(days) if d <= end_date), None)
+        if i is None and days:
+            lo = k + len(days) - 1
+        elif i:
+            return k + i
+        else:
+            hi = k
+    return hi
+
+
+def feed_page(response: Any) -> list[dict]:
+    """
+    Activities of a page of either activity feed, the search endpoint sends a list while connection feeds wrap it.
+    """
+    activities = response.get("activityList", []) if isinstance(response, dict) else response or []
+    return [a for a in activities if isinstance(a, dict)]
+
+
+def activity_days(activities: list[dict]) -> list[date]:
+    return [datetime.fromisoformat(a["startTimeLocal"]).date() for a in activities]
+
+
+def seek_feed(
+    offsets: OffsetIndex,
+    feed: str,
+    end_date: date,
+    page_size: int,
+) -> Generator[int, list[dict], tuple[int, list[dict] | None]]:
+    """
+    Drive seek_offset over the pages of a feed, remembering the offsets seen on the way for the next seeks.
+    The generator yields the offsets of the pages it needs and expects each page (as returned by feed_page) back.
+    :return: The offset of the newest activity on or before end_date and the page starting at it when it was already
+        fetched while searching
+    """
+    seek = seek_offset(end_date, offsets.lower_bound(feed, end_date), page_size)
+    start = next(seek)
+    while True:
+        page = yield start
+        days = activity_days(page)
+        offsets.add_page(feed, start, days)
+        try:
+            offset = seek.send(days)
+        except StopIteration as e:
+            logger.debug(f"activities on or before {end_date} start at offset {e.value}")
+            return e.value, page if e.value == start else None
+        start = offset
+
+
+class RangeCollector:
+    """
+    Collects the activities of a range of days from the consecutive pages of a newest first feed.
+    Pages are expected in order from the offset the range starts at (see seek_feed), the collector tells when the feed
+    has left the range behind so no more pages are requested.
+    """
+
+    def __init__(self, offsets: OffsetIndex, feed: str, start: int, start_date: date, end_date: date, page_size: int):
+        """
+        :param offsets: Index updated with the offsets of the pages
+        :param feed: Path of the feed the pages come from
+        :param start: Offset of the first page
+        :param start_date: First day of the range
+        :param end_date: Last day of the range
+        :param page_size: Number of activities in each page
+        """
+        self.offsets = offsets
+        self.feed = feed
+        self.start_date = start_date
+        self.end_date = end_date
+        self.page_size = page_size
+        self.activities: list[dict] = []
+        self._start = start
+
+    def add(self, page: list[dict]) -> bool:
+        """
+        :return: True when the range is complete
+        """
+        days = activity_days(page)
+        self.offsets.add_page(self.feed, self._start, days)
+        self._start += self.page_size
+        for activity, day in zip(page, days):
+            if day < self.start_date:
+                return True
+            if day <= self.end_date:
+                self.activities.append(activity)
+        return len(page) < self.page_size
+
+
+class Readahead:
+    """
+    Offsets of the pages of a feed to request ahead of the one being read.
+    The window starts at a single page and doubles after each full page up to the limit, so the walks ending in their
+    first pages, most of them, don't pay for speculative requests while long ones soon have every page of the window in
+    flight.
+    """
+
+    def __init__(self, start: int, page_size: int, limit: int):
+        """
+        :param start: Offset of the first page
+        :param page_size: Number of activities in each page
+        :param limit: Largest number of pages in flight, at least 1
+        """
+        self.page_size = page_size
+        self.limit = max(1, limit)
+        self.window = 1
+        self._next = start
+
+    def offsets(self, in_flight: int) -> list[int]:
+        """
+        :param in_flight: Number of pages already requested and not read yet
+        :return: The offsets of the pages to request so the window is full
+        """
+        count = max(0, self.window - in_flight)
+        offsets = [self._next + i * self.page_size for i in range(count)]
+        self._next += count * self.page_size
+        return offsets
+
+    def grow(self):
+        """
+        A full page was read, so the walk is likely to go on.
+        """
+        self.window = min(self.window * 2, self.limit)
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from datetime import timedelta
+
+from rgarmin.async_client import AsyncGarminClient
+from rgarmin.cache import CacheBackend, ResponseCache
+from rgarmin.client import GarminClient
+
+logger = logging.getLogger(__name__)
+
+IDLE_TIMEOUT = timedelta(minutes=30)  # time a client is kept logged in after its last use
+
+
+class GarminClientPool:
+    """
+    Clients of several Garmin accounts, each one logged in with its own token store.
+    Every account gets its own session, response cache and rate limiter, so accounts never share connections, cached
+    responses or rate budget (caches may share a backend as their keys are namespaced by account and login). Clients
+    are logged in the first time their account is used and closed once they have been idle for a while, pinned clients
+    are kept until the pool is closed.
+    """
+
+    def __init__(
+        self,
+        tokenstores: dict[str, str],
+        is_cn=False,
+        idle_timeout: timedelta = IDLE_TIMEOUT,
+        cache_backend: CacheBackend | None = None,
+        on_evict: Callable[[str], None] | None = None,
+    ):
+        """
+        :param tokenstores: Token store directory of each account, by account name
+        :param is_cn: Use the Chinese Garmin domain
+        :param idle_timeout: Time an unpinned client is kept after its last use
+        :param cache_backend: (Optional) Backend of the response caches, each client keeps its own in memory by default
+        :param on_evict: (Optional) Called with each evicted account, to release what was opened along with its client
+        """
+        self.tokenstores = tokenstores
+        self.is_cn = is_cn
+        self.idle_timeout = idle_timeout
+        self.cache_backend = cache_backend
+        self.on_evict = on_evict
+        self._clients: dict[str, AsyncGarminClient] = {}
+        self._last_used: dict[str, float] = {}
+        self._pinned: set[str] = set()
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._evictor: asyncio.Task | None = None
+
+    @property
+    def accounts(self) -> list[str]:
+        return list(self.tokenstores)
+
+    def pin(self, account: str, client: AsyncGarminClient):
+        """
+        Add an already logged in client that is never evicted.
+        """
+        self._clients[account] = client
+        self._pinned.add(account)
+        self._last_used[account] = time.monotonic()
+
+    async def get(self, account: str) -> AsyncGarminClient:
+        """
+        :param account: Name of the account
+        :return: The client of the account, logged in on first use
+        :raises KeyError: If the account is not configured
+        :raises FileNotFoundError: If the token store of the account doesn't exist
+        """
+        if account not in self.tokenstores and account not in self._pinned:
+            raise KeyError(account)
+        self._last_used[account] = time.monotonic()
+
+        client = self._clients.get(account)
+        if client is not None:
+            return client
+
+        # concurrent first uses of an account share a single login
+        async with self._locks.setdefault(account, asyncio.Lock()):
+            client = self._clients.get(account)
+            if client is None:
+                client = self._clients[account] = await self._login(account)
+        return client
+
+    def start(self):
+        if self._evictor is None:
+            self._evictor = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._evictor is not None:
+            self._evictor.cancel()
+            await asyncio.gather(self._evictor, return_exceptions=True)
+            self._evictor = None
+        await asyncio.gather(*[c.close() for c in self._clients.values()])
+        self._clients.clear()
+
+    async def evict_idle(self) -> list[str]:
+        """
+        Close the unpinned clients that haven't been used for the idle timeout.
+        :return: The evicted accounts
+        """
+        deadline = time.monotonic() - self.idle_timeout.total_seconds()
+        evicted = [
+            account
+            for account in self._clients
+            if account not in self._pinned and self._last_used.get(account, 0) < deadline
+        ]
+        clients = [self._clients.pop(account) for account in evicted]
+        await asyncio.gather(*[c.close() for c in clients])
+        if self.on_evict is not None:
+            for account in evicted:
+                self.on_evict(account)
+        if evicted:
+            logger.info(f"evicted idle clients of {evicted}")
+        return evicted
+
+    async def _login(self, account: str) -> AsyncGarminClient:
+        tokenstore = self.tokenstores[account]
+        logger.info(f"logging in {account} from {tokenstore}")
+        # the pool runs unattended, accounts without tokens can't fall back to the interactive login
+        cache = ResponseCache(policy=GarminClient.CACHE_POLICY, backend=self.cache_backend, namespace=account)
+        # loading the tokens and the account snapshot reads (and may refresh) files, so it doesn't run on the loop
+        client = await asyncio.to_thread(
+            AsyncGarminClient, is_cn=self.is_cn, tokenstore=tokenstore, cache=cache, interactive=False
+        )
+        try:
+            await client.load_account()
+        except BaseException:
+            await client.close()
+            raise
+        return client
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.idle_timeout.total_seconds() / 4)
+            await self.evict_idle()
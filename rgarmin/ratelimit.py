@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)  # same statuses garth retries by default
+THROTTLE_STATUSES = (429, 503)  # statuses that mean Garmin wants us to slow down
+RETRY_METHODS = ("GET", "HEAD")  # methods whose requests can be sent again after a server error
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all the requests of a client, from any thread or event loop.
+    Each request reserves a token and waits until it is available, so concurrent callers are queued in order instead
+    of racing. Throttling responses halve the rate and pause the whole bucket for the Retry-After time (or an
+    exponential backoff with jitter), and each successful request recovers the rate back towards the configured one.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10,
+        burst: int = 20,
+        min_rate: float = 0.5,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 60,
+    ):
+        """
+        :param rate: Max requests per second
+        :param burst: Requests that can be sent at once after being idle
+        :param min_rate: Lowest rate the adaptive backoff can reduce the bucket to
+        :param max_retries: Times a request is retried after a retryable status
+        :param backoff: Base seconds of the exponential backoff
+        :param max_backoff: Max seconds a request waits before being retried
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()  # can be in the future while the bucket is paused
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict[str, float]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "rate": self.rate,
+            "avg_wait": self.total_wait / self.requests if self.requests else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+    def reserve(self) -> float:
+        """
+        Take a token from the bucket.
+        :return: Seconds the caller has to wait before sending its request
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now > self._updated:
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+            self._tokens -= 1
+            wait = (self._updated - now) + max(0.0, -self._tokens) / self.rate
+
+            self.requests += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        while wait > 0:
+            time.sleep(wait)
+            # requests already queued also wait for a pause that started while they were waiting
+            wait = self._paused_until - time.monotonic()
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self._paused_until - time.monotonic()
+
+    def success(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def should_retry(
+        self,
+        status: int,
+        attempt: int,
+        retry_after: str | None = None,
+        idempotent: bool = True,
+    ) -> bool:
+        """
+        Register a failed request and pause the bucket when it can be retried.
+        :param status: HTTP status of the failed request
+        :param attempt: Times the request has already been retried
+        :param retry_after: (Optional) Retry-After header of the response
+        :param idempotent: Whether the request can be sent twice, server errors are only retried when it can
+        :return: True if the request should be sent again, it will wait in the bucket for the backoff to finish
+        """
+        if status not in RETRY_STATUSES or attempt >= self.max_retries:
+            return False
+        if status >= 500 and not idempotent:
+            # the request may have been applied before failing
+            return False
+
+        delay = _parse_retry_after(retry_after)
+        if delay is not None and delay > self.max_backoff:
+            # pausing the whole bucket that long would stall every caller, the request fails instead
+            logger.warning(f"got {status} asking to retry in {delay:.0f}s, over the max backoff of {self.max_backoff}s")
+            if status in THROTTLE_STATUSES:
+                with self._lock:
+                    self.throttled += 1
+                    self.rate = max(self.min_rate, self.rate / 2)
+            return False
+        if delay is None:
+            delay = min(self.max_backoff, self.backoff * 2**attempt)
+            delay = random.uniform(delay / 2, delay)
+
+        with self._lock:
+            self.retries += 1
+            if status in THROTTLE_STATUSES:
+                self.throttled += 1
+                self.rate = max(self.min_rate, self.rate / 2)
+            # pause every caller, not only the one being retried
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._updated = max(self._updated, self._paused_until)
+            self._tokens = min(self._tokens, 0.0)
+
+        logger.warning(f"got {status}, retrying in {delay:.1f}s at {self.rate:.1f} requests/s")
+        return True
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    # Retry-After can be either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -1,90 +1,313 @@
+import asyncio
+import hashlib
 import logging
-from datetime import date, timedelta
+from collections.abc import AsyncIterator
+from datetime import date, datetime, timedelta
 from typing import Any
 
 from garth.exc import GarthHTTPError
 
-from pyutils.shortcuts import date_range
+from rgarmin.async_client import AsyncGarminClient
 from rgarmin.client import GarminClient
+from rgarmin.services.refresh import RefreshScheduler
+from rgarmin.services.sessions import ActivityBuckets, SessionLinker
+from rgarmin.services.sync import ensure_synced, is_covered, is_final, needs_sync
+from rgarmin.store import ActivityStore
+from rgarmin.types import ActivityListItem, Connection, UserProfile, to_json
 
 logger = logging.getLogger(__name__)
 
+# connections are as fresh as the response cache keeps them
+PROFILES_TTL = timedelta(seconds=GarminClient.CACHE_POLICY[GarminClient.ConnectURL.CONNECTIONS])
 
-def get_json_activities(garmin: GarminClient, connections: list[str], start_date: date, end_date: date) -> dict:
-    profiles = garmin.get_connections()
+
+def get_activities_version(
+    garmin: AsyncGarminClient,
+    store: ActivityStore,
+    connections: list[str],
+    start_date: date,
+    end_date: date,
+    refresher: RefreshScheduler | None = None,
+) -> tuple[str, bool] | None:
+    """
+    Version of the activities of a range as they are currently stored, it changes whenever any of them does.
+    Only ranges the store can serve without waiting for Garmin have a version, stale owners and connections are
+    revalidated in the background the same way they are when the range is served.
+    :return: The version and whether it is final (every owner was synced once the range could no longer change), or
+        None when the range or the stored connections have to be synced first
+    """
+    # profiles are rendered with the activities, the stored ones are hashed so validating never waits for Garmin
+    stored = store.get_connections()
+    if stored is None:
+        return None
+    if datetime.now() - stored.synced_at > PROFILES_TTL:
+        if refresher is None:
+            return None
+        refresher.revalidate_connections()
+
+    owners = [garmin.display_name, *connections]
+    versions = []
+    final = True
+    for owner in owners:
+        state = store.get_sync_state(owner)
+        if needs_sync(state, start_date, end_date):
+            if refresher is None or not is_covered(state, start_date, end_date):
+                return None
+            refresher.revalidate(owner, start_date)
+        assert state is not None
+        final &= is_final(state, start_date, end_date)
+        versions.append(store.get_version(owner, start_date, end_date))
+
+    digest = hashlib.sha1(to_json([owners, versions, garmin.profile, stored.connections]))
+    return digest.hexdigest(), final
+
+
+async def get_profiles(garmin: AsyncGarminClient, store: ActivityStore) -> list[Connection]:
+    """
+    Fetch the connections of the user, the last ones fetched are kept in the store and served while Garmin fails.
+    """
+    stored = store.get_connections()
+    try:
+        profiles = await garmin.get_connections()
+    except GarthHTTPError as e:
+        logger.error(f"Error fetching connections, serving the stored ones: {e}")
+        return stored.connections if stored else []
+    # written when they change, or once half their TTL passed to record they are still current
+    if stored is None or stored.connections != profiles or datetime.now() - stored.synced_at > PROFILES_TTL / 2:
+        store.set_connections(profiles, datetime.now())
+    return profiles
+
+
+async def get_json_activities(
+    garmin: AsyncGarminClient,
+    store: ActivityStore,
+    connections: list[str],
+    start_date: date,
+    end_date: date,
+    refresher: RefreshScheduler | None = None,
+) -> dict:
+    profiles, own_activities, connection_activities, errors = await _fetch_activities(
+        garmin, store, connections, start_date, end_date, refresher
+    )
     result: dict[str, Any] = {
         "pagination": _get_week_pagination(connections, start_date, end_date),
         "connection_activities": [
             {
                 "display_name": garmin.profile.display_name,
                 "profile": garmin.profile,
-                "activities": garmin.get_activities_by_date(start_date, end_date),
+                "activities": own_activities,
             }
         ],
-        "errors": {},
+        "errors": errors,
     }
 
-    for connection in connections:
-        try:
-            result["connection_activities"].append(
-                {
-                    "display_name": connection,
-                    "profile": next(c for c in profiles if c.display_name == connection),
-                    "activities": garmin.get_connection_activities_by_date(connection, start_date, end_date),
-                }
-            )
-        except GarthHTTPError as e:
-            logger.error(f"Error fetching activities for {connection}: {e}")
-            result["errors"][connection] = "_error_fetching_activities"
+    for connection, activities in connection_activities.items():
+        result["connection_activities"].append(
+            {
+                "display_name": connection,
+                "profile": next(c for c in profiles if c.display_name == connection),
+                "activities": activities,
+            }
+        )
 
+    buckets = ActivityBuckets(start_date, end_date)
+    for connection in result["connection_activities"]:
+        buckets.add(connection["profile"], connection["activities"])
+    result["groups"] = buckets.groups()
     return result
 
 
-def _process_similar_activities(activities: list[dict[str, Any]]) -> list[dict[str, Any]]:
-    for activity1 in activities:
-        for activity2 in activities:
-            if activity1["profile"].display_name == activity2["profile"].display_name:
-                # activities from the same profile can't be similar
-                continue
-            if activity2["details"].activity_id in activity1["details"].similar_activities:
-                # we add activities both ways so we can reach this point and skip a lot of activities
-                continue
+async def _fetch_activities(
+    garmin: AsyncGarminClient,
+    store: ActivityStore,
+    connections: list[str],
+    start_date: date,
+    end_date: date,
+    refresher: RefreshScheduler | None = None,
+) -> tuple[list[Connection], list[ActivityListItem], dict[str, list[ActivityListItem]], dict[str, str]]:
+    """
+    Sync the user activities and the ones of each connection concurrently and read them from the store.
+    Returned connection activities keep the order of the given connections and failing connections are reported in
+    the errors dict instead of aborting the whole fetch, as well as connections without a known profile.
+    :param garmin: Client used to sync the store
+    :param store: Store the activities are read from
+    :param connections: Display names of the connections to fetch
+    :param start_date: First day of the range
+    :param end_date: Last day of the range
+    :param refresher: (Optional) Scheduler used to revalidate stale ranges in the background
+    """
+    # concurrency is bounded by the client session pool, gather keeps the order of the given owners
+    profiles, *results = await asyncio.gather(
+        get_profiles(garmin, store),
+        *[
+            _fetch_owner_activities(garmin, store, owner, start_date, end_date, refresher)
+            for owner in [garmin.display_name, *connections]
+        ],
+    )
 
-            if activity1["details"] == activity2["details"]:
-                activity1["details"].similar_activities.append(activity2["details"].activity_id)
-                activity2["details"].similar_activities.append(activity1["details"].activity_id)
-    return activities
+    known = {garmin.display_name, *(c.display_name for c in profiles)}
+    connection_activities: dict[str, list[ActivityListItem]] = {}
+    errors: dict[str, str] = {}
+    for owner, activities in zip([garmin.display_name, *connections], results):
+        if owner not in known:
+            errors[owner] = "_unknown_connection"
+        elif activities is None:
+            errors[owner] = "_error_fetching_activities"
+        else:
+            connection_activities[owner] = activities
 
+    own_activities = connection_activities.pop(garmin.display_name, [])
+    return profiles, own_activities, connection_activities, errors
 
-def get_html_activities(garmin: GarminClient, connections: list[str], start_date: date, end_date: date) -> dict:
-    profiles = garmin.get_connections()
-    results = {"Monday": [], "Tuesday": [], "Wednesday": [], "Thursday": [], "Friday": [], "Saturday": [], "Sunday": []}
-    errors = {}
 
-    for activity in garmin.get_activities_by_date(start_date, end_date):
-        results[activity.weekday].append({"profile": garmin.profile, "details": activity})
+async def _fetch_owner_activities(
+    garmin: AsyncGarminClient,
+    store: ActivityStore,
+    owner: str,
+    start_date: date,
+    end_date: date,
+    refresher: RefreshScheduler | None = None,
+) -> list[ActivityListItem] | None:
+    revalidate = refresher.revalidate if refresher else None
+    if not await ensure_synced(garmin, store, owner, start_date, end_date, revalidate):
+        return None
+    return store.get_activities(owner, start_date, end_date)
 
-    for connection in connections:
-        try:
-            profile = next(c for c in profiles if c.display_name == connection)
-            for activity in garmin.get_connection_activities_by_date(connection, start_date, end_date):
-                results[activity.weekday].append({"profile": profile, "details": activity})
-        except GarthHTTPError as e:
-            logger.error(f"Error fetching activities for {connection}: {e}")
-            errors[connection] = "_error_fetching_activities"
-
-    for key, value in results.items():
-        results[key] = _process_similar_activities(value)
-        results[key].sort(key=lambda x: x["details"].start_time_local)
+
+async def get_html_activities(
+    garmin: AsyncGarminClient,
+    store: ActivityStore,
+    connections: list[str],
+    start_date: date,
+    end_date: date,
+    refresher: RefreshScheduler | None = None,
+) -> dict:
+    profiles, own_activities, connection_activities, errors = await _fetch_activities(
+        garmin, store, connections, start_date, end_date, refresher
+    )
+    buckets = ActivityBuckets(start_date, end_date)
+    buckets.add(garmin.profile, own_activities)
+    for connection, items in connection_activities.items():
+        buckets.add(next(c for c in profiles if c.display_name == connection), items)
+    # sessions are computed over the whole range
+    buckets.groups()
 
     return {
-        "daily_activities": results,
-        "days": [d.strftime("%d-%m-%Y") for d in date_range(start_date, end_date)],
+        "daily_activities": buckets.days,
         "pagination": _get_week_pagination(connections, start_date, end_date),
         "errors": errors,
     }
 
 
+async def stream_html_activities(
+    garmin: AsyncGarminClient,
+    store: ActivityStore,
+    connections: list[str],
+    start_date: date,
+    end_date: date,
+    refresher: RefreshScheduler | None = None,
+) -> AsyncIterator[dict]:
+    """
+    Same week view as get_html_activities but split in sections that are yielded as soon as their data is ready.
+    The page shell comes first, then the activities of each owner in the order their feeds finish, then the group
+    sessions (which need every activity) and finally the errors.
+    :return: The context of each section with its kind in "section": 'shell', 'activities', 'sessions' or 'errors'
+    """
+    # resolved before the first section, once the response has started failures can't change its status anymore
+    profiles = await _get_owner_profiles(garmin, store)
+    buckets = ActivityBuckets(start_date, end_date)
+    yield {
+        "section": "shell",
+        "daily_activities": {day: [] for day in buckets.days},
+        "pagination": _get_week_pagination(connections, start_date, end_date),
+        "errors": {},
+    }
+
+    known = [o for o in [garmin.display_name, *connections] if o in profiles]
+    errors: dict[str, str] = {c: "_unknown_connection" for c in connections if c not in profiles}
+    i = 0
+    async for owner, items in _stream_owner_activities(garmin, store, known, start_date, end_date, refresher):
+        if items is None:
+            errors[owner] = "_error_fetching_activities"
+            continue
+        # sessions are linked as each feed lands, while the slower ones are still being fetched
+        chunk = buckets.add(profiles[owner], items)
+        yield {"section": "activities", "chunk_id": f"activities-{i}", "activities": chunk}
+        i += 1
+
+    groups = buckets.groups()
+    yield {"section": "sessions", "groups": {a: group for group, ids in groups.items() for a in ids}}
+    owners = [garmin.display_name, *connections]
+    yield {"section": "errors", "chunk_id": "errors", "errors": {o: errors[o] for o in owners if o in errors}}
+
+
+async def stream_json_activities(
+    garmin: AsyncGarminClient,
+    store: ActivityStore,
+    connections: list[str],
+    start_date: date,
+    end_date: date,
+    refresher: RefreshScheduler | None = None,
+) -> AsyncIterator[dict]:
+    """
+    Same data as get_json_activities but as a sequence of records yielded as soon as their data is ready.
+    The pagination comes first, then the activities (or the error) of each owner in the order their feeds finish and
+    finally the group sessions, which need every activity.
+    :return: Records with their kind in "type": 'pagination', 'activities', 'error' or 'groups'
+    """
+    # resolved before the first record, once the response has started failures can't change its status anymore
+    profiles = await _get_owner_profiles(garmin, store)
+    yield {"type": "pagination", "pagination": _get_week_pagination(connections, start_date, end_date)}
+    for connection in connections:
+        if connection not in profiles:
+            yield {"type": "error", "display_name": connection, "error": "_unknown_connection"}
+
+    known = [o for o in [garmin.display_name, *connections] if o in profiles]
+    sessions = SessionLinker()
+    async for owner, items in _stream_owner_activities(garmin, store, known, start_date, end_date, refresher):
+        if items is None:
+            yield {"type": "error", "display_name": owner, "error": "_error_fetching_activities"}
+            continue
+        # only the fields needed to link the sessions are kept, the activities are released once sent
+        for item in items:
+            sessions.add(owner, item)
+        yield {"type": "activities", "display_name": owner, "profile": profiles[owner], "activities": items}
+
+    yield {"type": "groups", "groups": sessions.groups()}
+
+
+async def _get_owner_profiles(garmin: AsyncGarminClient, store: ActivityStore) -> dict[str, Connection | UserProfile]:
+    profiles: dict[str, Connection | UserProfile] = {c.display_name: c for c in await get_profiles(garmin, store)}
+    profiles[garmin.display_name] = garmin.profile
+    return profiles
+
+
+async def _stream_owner_activities(
+    garmin: AsyncGarminClient,
+    store: ActivityStore,
+    owners: list[str],
+    start_date: date,
+    end_date: date,
+    refresher: RefreshScheduler | None = None,
+) -> AsyncIterator[tuple[str, list[ActivityListItem] | None]]:
+    """
+    Fetch the activities of the given owners concurrently, yielding them in the order they finish.
+    :return: The display name and activities of each owner, activities are None when they couldn't be fetched
+    """
+
+    async def fetch_activities(owner: str) -> tuple[str, list[ActivityListItem] | None]:
+        return owner, await _fetch_owner_activities(garmin, store, owner, start_date, end_date, refresher)
+
+    tasks = [asyncio.create_task(fetch_activities(owner)) for owner in owners]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 def _get_week_pagination(connections: list[str], start_date: date, end_date: date) -> dict:
     conn_url = f"connections={'&connections='.join(connections)}"
     next_url = (
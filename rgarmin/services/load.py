@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import Any
+
+import numpy as np
+
+from pyutils.shortcuts import week_range_from_date
+from rgarmin.async_client import AsyncGarminClient
+from rgarmin.services.refresh import RefreshScheduler
+from rgarmin.services.sync import ensure_synced
+from rgarmin.store import ActivityStore, DailyLoad
+
+logger = logging.getLogger(__name__)
+
+ACUTE_LOAD_DAYS = 7
+CHRONIC_LOAD_DAYS = 28
+
+
+async def get_json_load(
+    garmin: AsyncGarminClient,
+    store: ActivityStore,
+    connections: list[str],
+    start_date: date,
+    end_date: date,
+    refresher: RefreshScheduler | None = None,
+) -> dict:
+    """
+    Weekly training trends of the user and each connection.
+    Trends are built from the daily rollups kept by the store, which are updated as new activities are synced, so
+    long ranges only read one row per day with activities instead of parsing every activity.
+    :param garmin: Client used to sync the store
+    :param store: Store the rollups are read from
+    :param connections: Display names of the connections to include
+    :param start_date: First day of the range, trends start on the first day of its week
+    :param end_date: Last day of the range, trends end on the last day of its week
+    :param refresher: (Optional) Scheduler used to revalidate stale ranges in the background
+    """
+    first_day = week_range_from_date(start_date)[0]
+    last_day = week_range_from_date(end_date)[1]
+    # chronic load of the first week needs the previous weeks too
+    history_start = first_day - timedelta(days=CHRONIC_LOAD_DAYS - 1)
+    revalidate = refresher.revalidate if refresher else None
+
+    async def fetch_loads(owner: str) -> list[DailyLoad] | None:
+        if not await ensure_synced(garmin, store, owner, history_start, last_day, revalidate):
+            return None
+        return store.get_daily_loads(owner, history_start, last_day)
+
+    owners = [garmin.display_name, *connections]
+    results = await asyncio.gather(*[fetch_loads(owner) for owner in owners])
+
+    athletes: list[dict[str, Any]] = []
+    errors: dict[str, str] = {}
+    for owner, loads in zip(owners, results):
+        if loads is None:
+            errors[owner] = "_error_fetching_activities"
+            continue
+        athletes.append({"display_name": owner, "weeks": _weekly_trends(loads, history_start, first_day, last_day)})
+
+    return {
+        "start_date": first_day,
+        "end_date": last_day,
+        "acute_load_days": ACUTE_LOAD_DAYS,
+        "chronic_load_days": CHRONIC_LOAD_DAYS,
+        "athletes": athletes,
+        "errors": errors,
+    }
+
+
+def _weekly_trends(loads: list[DailyLoad], history_start: date, first_day: date, last_day: date) -> list[dict]:
+    """
+    Weekly totals and the acute and chronic loads at the end of each week, as the average daily load of the last
+    ACUTE_LOAD_DAYS and CHRONIC_LOAD_DAYS days.
+    """
+    size = (last_day - history_start).days + 1
+    activities, duration, distance, training_load = np.zeros(size), np.zeros(size), np.zeros(size), np.zeros(size)
+    zones = np.zeros((size, 5))
+    for load in loads:
+        i = (load.day - history_start).days
+        activities[i] = load.activities
+        duration[i] = load.duration
+        distance[i] = load.distance
+        training_load[i] = load.training_load
+        zones[i] = load.hr_time_in_zones
+
+    cumulative = np.concatenate(([0.0], np.cumsum(training_load)))
+    week_ends = np.arange((first_day - history_start).days + 6, size, 7)
+    acute = (cumulative[week_ends + 1] - cumulative[week_ends + 1 - ACUTE_LOAD_DAYS]) / ACUTE_LOAD_DAYS
+    chronic = (cumulative[week_ends + 1] - cumulative[week_ends + 1 - CHRONIC_LOAD_DAYS]) / CHRONIC_LOAD_DAYS
+
+    def weekly(values: np.ndarray) -> np.ndarray:
+        return values[size - len(week_ends) * 7 :].reshape(len(week_ends), 7, *values.shape[1:]).sum(axis=1)
+
+    weeks = zip(
+        weekly(activities).tolist(),
+        weekly(duration).tolist(),
+        weekly(distance).tolist(),
+        weekly(training_load).tolist(),
+        weekly(zones).tolist(),
+        acute.tolist(),
+        chronic.tolist(),
+    )
+    return [
+        {
+            "week": first_day + timedelta(weeks=i),
+            "activities": int(w_activities),
+            "duration": w_duration,
+            "distance": w_distance,
+            "training_load": w_load,
+            "hr_time_in_zones": w_zones,
+            "acute_load": w_acute,
+            "chronic_load": w_chronic,
+            "acute_chronic_ratio": w_acute / w_chronic if w_chronic else None,
+        }
+        for i, (w_activities, w_duration, w_distance, w_load, w_zones, w_acute, w_chronic) in enumerate(weeks)
+    ]
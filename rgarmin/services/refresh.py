@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import random
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from garth.exc import GarthHTTPError
+
+from rgarmin.async_client import AsyncGarminClient
+from rgarmin.services.sync import live_from, sync_activities
+from rgarmin.store import ActivityStore
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = timedelta(minutes=5)
+REFRESH_CONCURRENCY = 4  # owners synced at the same time
+REFRESH_JITTER = 0.2  # fraction of the interval each refresh is randomly delayed
+
+
+class RefreshScheduler:
+    """
+    Keeps the current and previous week of the configured owners warm in the activity store.
+    Owners are refreshed periodically in the background and page views of a stale (but stored) range are served
+    straight from the store while the owner is revalidated, so only ranges never synced before wait for Garmin.
+    """
+
+    def __init__(
+        self,
+        garmin: AsyncGarminClient,
+        store: ActivityStore,
+        connections: list[str],
+        interval: timedelta = REFRESH_INTERVAL,
+        concurrency: int = REFRESH_CONCURRENCY,
+        jitter: float = REFRESH_JITTER,
+    ):
+        """
+        :param garmin: Client used to sync the store
+        :param store: Store to keep warm
+        :param connections: Display names of the connections refreshed periodically, the user is always refreshed
+        :param interval: Time between two refreshes of the same owner
+        :param concurrency: Max owners synced at the same time
+        :param jitter: Fraction of the interval refreshes are randomly spread over
+        """
+        self.garmin = garmin
+        self.store = store
+        self.connections = connections
+        self.interval = interval
+        self.jitter = jitter
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self._connections: asyncio.Task | None = None
+        self._loop: asyncio.Task | None = None
+
+    def start(self):
+        if self._loop is None:
+            self._loop = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = [t for t in [self._loop, self._connections, *self._refreshing.values()] if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop = None
+
+    def revalidate(self, owner: str, since: date | None = None, delay: float = 0) -> asyncio.Task:
+        """
+        Sync an owner in the background unless it is already being synced.
+        :param owner: Display name of the owner
+        :param since: (Optional) Oldest day to sync, the first one that can still change by default
+        :param delay: Seconds to wait before syncing
+        """
+        task = self._refreshing.get(owner)
+        if task is None:
+            task = self._refreshing[owner] = asyncio.create_task(self._refresh(owner, since, delay))
+            task.add_done_callback(lambda _: self._refreshing.pop(owner, None))
+        return task
+
+    def revalidate_connections(self) -> asyncio.Task:
+        """
+        Fetch the connections of the user into the store in the background unless they are already being fetched.
+        """
+        if self._connections is None or self._connections.done():
+            self._connections = asyncio.create_task(self._refresh_connections())
+        return self._connections
+
+    async def _run(self):
+        while True:
+            try:
+                # the display name is read below, load it here so a missing snapshot doesn't block the loop
+                await self.garmin.load_account()
+            except GarthHTTPError as e:
+                logger.error(f"Error loading the account, retrying on the next refresh: {e}")
+            else:
+                owners = [self.garmin.display_name, *self.connections]
+                max_delay = self.interval.total_seconds() * self.jitter
+                logger.debug(f"refreshing {len(owners)} owners")
+                await asyncio.gather(
+                    self.revalidate_connections(),
+                    # spread the refreshes so they don't burst against Garmin
+                    *[self.revalidate(owner, delay=random.uniform(0, max_delay)) for owner in owners],
+                    return_exceptions=True,
+                )
+            await asyncio.sleep(self.interval.total_seconds() * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def _refresh_connections(self):
+        # activities is built on top of the scheduler
+        from rgarmin.services.activities import get_profiles
+
+        # connections are listed in every page view and stored for validating them, see get_activities_version
+        self.garmin.cache.invalidate(self.garmin.ConnectURL.CONNECTIONS)
+        await get_profiles(self.garmin, self.store)
+
+    async def _refresh(self, owner: str, since: date | None, delay: float):
+        since = since or live_from(date.today())
+        await asyncio.sleep(delay)
+        async with self._semaphore:
+            state = self.store.get_sync_state(owner)
+            if state and state.covered_from <= since and datetime.now() - state.synced_at < self.interval / 2:
+                # already refreshed by another worker sharing the store
+                logger.debug(f"skipping refresh of {owner}, synced at {state.synced_at}")
+                return
+            try:
+                await sync_activities(self.garmin, self.store, owner, since)
+            except (GarthHTTPError, sqlite3.OperationalError) as e:
+                logger.error(f"Error refreshing activities for {owner}: {e}")
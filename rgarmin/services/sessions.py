@@ -0,0 +1,153 @@
+import bisect
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any
+
+from pyutils.shortcuts import date_range
+from rgarmin.types import ActivityListItem, Connection, UserProfile
+from rgarmin.types.activity import SIMILAR_START_WINDOW, is_similar
+
+logger = logging.getLogger(__name__)
+
+
+class _DisjointSet:
+    """
+    Union-find over activity ids where the root of each set is its smallest id, so group ids are stable.
+    """
+
+    def __init__(self):
+        self.parent: dict[int, int] = {}
+
+    def find(self, x: int) -> int:
+        self.parent.setdefault(x, x)
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a: int, b: int):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+@dataclass(frozen=True, slots=True)
+class _Candidate:
+    # the fields of an activity needed to link it into a session
+    activity_id: int
+    owner: str
+    start_time_local: datetime
+    distance: float | None
+    duration: float | None
+
+
+class SessionLinker:
+    """
+    Group sessions of activities added in any order, keeping only the few fields each activity needs to be linked.
+    Activities of different profiles are linked when they are similar (see is_similar) and sessions are the connected
+    components of those links. Similar activities start close to each other, so each added activity is only compared
+    with the ones already in its start window, which are in its own day or, around midnight, in the adjacent one.
+    """
+
+    def __init__(self):
+        self._days: dict[date, list[_Candidate]] = defaultdict(list)  # each day sorted by start time
+        self._sessions = _DisjointSet()
+
+    def add(self, owner: str, details: ActivityListItem) -> int:
+        """
+        :param owner: Display name of the owner of the activity
+        :param details: The activity
+        :return: Position of the activity in its day, by start time
+        """
+        candidate = _Candidate(details.activity_id, owner, details.start_time_local, details.distance, details.duration)
+        self._link(candidate)
+
+        day = self._days[candidate.start_time_local.date()]
+        i = bisect.bisect_right(day, candidate.start_time_local, key=_start)
+        day.insert(i, candidate)
+        return i
+
+    def group_of(self, activity_id: int) -> str | None:
+        """
+        :return: Id of the session of the activity, None when done alone
+        """
+        if activity_id not in self._sessions.parent:
+            return None
+        return f"g{self._sessions.find(activity_id)}"
+
+    def groups(self) -> dict[str, list[int]]:
+        """
+        :return: The activity ids of each session, in start time order
+        """
+        groups: dict[str, list[int]] = defaultdict(list)
+        activities = 0
+        for day in sorted(self._days):
+            activities += len(self._days[day])
+            for candidate in self._days[day]:
+                group = self.group_of(candidate.activity_id)
+                if group:
+                    groups[group].append(candidate.activity_id)
+
+        logger.debug(f"found {len(groups)} group sessions in {activities} activities")
+        return dict(groups)
+
+    def _link(self, candidate: _Candidate):
+        window_start = candidate.start_time_local - SIMILAR_START_WINDOW
+        window_end = candidate.start_time_local + SIMILAR_START_WINDOW
+
+        first_day, last_day = window_start.date(), window_end.date()
+        for day in (first_day,) if first_day == last_day else (first_day, last_day):
+            others = self._days.get(day)
+            if not others:
+                continue
+            lo = bisect.bisect_left(others, window_start, key=_start)
+            hi = bisect.bisect_right(others, window_end, key=_start)
+            for other in others[lo:hi]:
+                if other.owner == candidate.owner:
+                    # activities from the same profile can't be similar
+                    continue
+                # similarity is not symmetric for distance and duration, so both ways are checked
+                if is_similar(candidate, other) or is_similar(other, candidate):
+                    self._sessions.union(candidate.activity_id, other.activity_id)
+
+
+class ActivityBuckets:
+    """
+    Activities of a date range bucketed by calendar day, each bucket sorted by start time as activities are added.
+    Group sessions are linked while adding (see SessionLinker), so they are ready as soon as the last feed lands.
+    """
+
+    def __init__(self, start_date: date, end_date: date):
+        self.days: dict[date, list[dict[str, Any]]] = {day: [] for day in date_range(start_date, end_date)}
+        self.sessions = SessionLinker()
+
+    def add(self, profile: Connection | UserProfile, items: list[ActivityListItem]) -> list[dict[str, Any]]:
+        """
+        :param profile: Profile the activities belong to
+        :param items: Activities of the profile, in any order
+        :return: The added activities as {"profile": ..., "details": ActivityListItem}
+        """
+        added = []
+        for details in items:
+            activity = {"profile": profile, "details": details}
+            # buckets keep the same start time order as the days of the linker
+            i = self.sessions.add(profile.display_name, details)
+            self.days[details.start_time_local.date()].insert(i, activity)
+            added.append(activity)
+        return added
+
+    def groups(self) -> dict[str, list[int]]:
+        """
+        Set the session id of each activity in "group" (None when done alone).
+        :return: The activity ids of each session, in start time order
+        """
+        for bucket in self.days.values():
+            for activity in bucket:
+                activity["group"] = self.sessions.group_of(activity["details"].activity_id)
+        return self.sessions.groups()
+
+
+def _start(candidate: _Candidate) -> datetime:
+    return candidate.start_time_local
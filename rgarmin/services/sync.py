@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import sqlite3
+from collections.abc import Callable
+from datetime import date, datetime, timedelta
+from typing import Any
+
+from garth.exc import GarthHTTPError
+
+from pyutils.shortcuts import week_range_from_date
+from rgarmin.async_client import AsyncGarminClient
+from rgarmin.store import ActivityStore, SyncState
+
+logger = logging.getLogger(__name__)
+
+SYNC_INTERVAL = timedelta(minutes=1)  # same freshness the response cache gives to the activity feeds
+# activities can be uploaded late (with their original start time), edited or deleted, so the days of the current and
+# previous week are synced again on every sync and only the older ones are taken as final
+LIVE_WEEKS = timedelta(weeks=1)
+
+
+def live_from(day: date) -> date:
+    """
+    :return: First day that can still change as of the given day
+    """
+    return week_range_from_date(day)[0] - LIVE_WEEKS
+
+
+def needs_sync(state: SyncState | None, start_date: date, end_date: date) -> bool:
+    """
+    Check if the store has to be synced before serving the given range.
+    Ranges already covered are only refreshed once in a while, and days that were already final at the time of the
+    last sync are never refreshed again.
+    """
+    if not is_covered(state, start_date, end_date):
+        return True
+    if _in_ranges(state, start_date, end_date) or datetime.now() - state.synced_at < SYNC_INTERVAL:
+        return False
+    return not is_final(state, start_date, end_date)
+
+
+def is_covered(state: SyncState | None, start_date: date, end_date: date) -> bool:
+    """
+    Check if every activity of the given range was synced at some point.
+    """
+    return state is not None and (state.covered_from <= start_date or _in_ranges(state, start_date, end_date))
+
+
+def is_final(state: SyncState, start_date: date, end_date: date) -> bool:
+    """
+    Check if the stored activities of a covered range are final, they were synced once they could no longer change.
+    """
+    return _in_ranges(state, start_date, end_date) or end_date < live_from(state.synced_at.date())
+
+
+def _in_ranges(state: SyncState, start_date: date, end_date: date) -> bool:
+    return any(start <= start_date and end_date <= end for start, end in state.ranges)
+
+
+async def ensure_synced(
+    garmin: AsyncGarminClient,
+    store: ActivityStore,
+    owner: str,
+    start_date: date,
+    end_date: date,
+    revalidate: Callable[[str, date], Any] | None = None,
+) -> bool:
+    """
+    Sync the store when needed before serving the given range of an owner.
+    When Garmin fails and the range was already synced the stored activities are served as they are.
+    :param revalidate: (Optional) Schedules a background sync of an owner since a day, when given stale ranges that
+        were already synced are served from the store without waiting for the sync
+    :return: True if the store can serve the range
+    """
+    state = store.get_sync_state(owner)
+    if not needs_sync(state, start_date, end_date):
+        return True
+    if revalidate is not None and is_covered(state, start_date, end_date):
+        revalidate(owner, start_date)
+        return True
+    try:
+        await sync_activities(garmin, store, owner, start_date, end_date)
+    except (GarthHTTPError, sqlite3.OperationalError) as e:
+        # the store is shared by every worker, it can stay locked longer than the timeout
+        logger.error(f"Error syncing activities for {owner}: {e}")
+        return is_covered(state, start_date, end_date)
+    return True
+
+
+async def sync_activities(
+    garmin: AsyncGarminClient,
+    store: ActivityStore,
+    owner: str,
+    since: date,
+    until: date | None = None,
+) -> int:
+    """
+    Incrementally sync the activities of an owner into the store.
+    The stored history since covered_from is kept up to date fetching again, newest first, the days that could still
+    change since the last sync (see live_from), stored activities of those days that Garmin no longer sends are
+    deleted. When the requested day is older than the stored history, the missing days are fetched on their own, so
+    connection feeds are seeked to them instead of walking the pages already stored. Final ranges older than the stored
+    history are stored apart, without extending it over the days in between.
+    :param garmin: Client used to fetch the activities
+    :param store: Store to sync
+    :param owner: Display name of the owner of the activities
+    :param since: Oldest day that has to be stored
+    :param until: (Optional) Newest day that has to be stored, up to the newest activity by default
+    :return: Number of stored activities that changed
+    """
+    state = store.get_sync_state(owner)
+    today = date.today()
+    detached = until is not None and until < live_from(today) and (state is None or until < state.covered_from)
+
+    segments: list[tuple[date, date | None]] = []
+    ranges = state.ranges if state else ()
+    if state is None:
+        # the history starts with the days that can still change, so later syncs only have to walk the first pages
+        covered_from = live_from(today) if detached else since
+        segments.append((covered_from, None))
+    else:
+        covered_from = state.covered_from
+        if not detached:
+            segments.append((max(state.covered_from, live_from(state.synced_at.date())), None))
+    if detached:
+        segments.append((since, until))
+        ranges += ((since, until),)
+    elif since < covered_from:
+        if segments and segments[0][0] == covered_from:
+            segments[0] = (since, None)
+        else:
+            segments.append((since, covered_from - timedelta(days=1)))
+        covered_from = since
+    logger.debug(f"syncing activities of {owner} for {segments}")
+
+    pages = await asyncio.gather(*[garmin.fetch_activities_range(owner, start, end) for start, end in segments])
+    changed = sum(store.replace(owner, start, end or date.max, p) for (start, end), p in zip(segments, pages))
+    fetched = [a for p in pages for a in p]
+
+    covered_from, ranges = _merge_ranges(covered_from, ranges)
+    store.set_sync_state(
+        owner,
+        SyncState(
+            newest=max([a["startTimeLocal"] for a in fetched] + ([state.newest] if state else [""])),
+            covered_from=covered_from,
+            synced_at=state.synced_at if state is not None and detached else datetime.now(),
+            ranges=ranges,
+        ),
+    )
+    logger.info(f"synced {len(fetched)} activities of {owner} for {segments}, {changed} changed")
+    return changed
+
+
+def _merge_ranges(
+    covered_from: date, ranges: tuple[tuple[date, date], ...]
+) -> tuple[date, tuple[tuple[date, date], ...]]:
+    # adjacent or overlapping ranges are joined, and the ones reaching the stored history extend it
+    merged: list[tuple[date, date]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    while merged and merged[-1][1] >= covered_from - timedelta(days=1):
+        covered_from = min(covered_from, merged.pop()[0])
+    return covered_from, tuple(merged)
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import threading
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls made from different threads.
+    The first caller of a key runs the call and every caller arriving while it is in flight waits for it, getting the
+    same result or error.
+    """
+
+    def __init__(self):
+        self.shared = 0
+        self._calls: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            is_leader = future is None
+            if future is None:
+                future = self._calls[key] = Future()
+            else:
+                self.shared += 1
+
+        if not is_leader:
+            logger.debug(f"waiting for in flight call {key}")
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces concurrent identical calls made from the same event loop.
+    The call runs in its own task, so a caller being cancelled doesn't cancel it for the rest of the callers. Once every
+    caller waiting for it is gone the task is cancelled too, so abandoned requests don't keep running.
+    """
+
+    def __init__(self):
+        self.shared = 0
+        self._calls: dict[str, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is not None:
+            self.shared += 1
+            logger.debug(f"waiting for in flight call {key}")
+        else:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._done(key, t))
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                # a no-op when the task is already done, the last caller was cancelled otherwise
+                task.cancel()
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # retrieve the error so it is not reported as never retrieved when every caller was cancelled
+            task.exception()
@@ -0,0 +1,281 @@
+import json
+import logging
+import sqlite3
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+
+from rgarmin.types import ActivityListItem, Connection
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS activities (
+    owner TEXT NOT NULL,
+    activity_id INTEGER NOT NULL,
+    start_time_local TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (owner, activity_id)
+);
+CREATE INDEX IF NOT EXISTS activities_owner_start ON activities (owner, start_time_local);
+CREATE TABLE IF NOT EXISTS daily_load (
+    owner TEXT NOT NULL,
+    day TEXT NOT NULL,
+    activities INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    distance REAL NOT NULL,
+    training_load REAL NOT NULL,
+    hr_time_in_zone_1 REAL NOT NULL,
+    hr_time_in_zone_2 REAL NOT NULL,
+    hr_time_in_zone_3 REAL NOT NULL,
+    hr_time_in_zone_4 REAL NOT NULL,
+    hr_time_in_zone_5 REAL NOT NULL,
+    PRIMARY KEY (owner, day)
+);
+CREATE TABLE IF NOT EXISTS daily_version (
+    owner TEXT NOT NULL,
+    day TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (owner, day)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    owner TEXT PRIMARY KEY,
+    newest TEXT NOT NULL,
+    covered_from TEXT NOT NULL,
+    synced_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS synced_ranges (
+    owner TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    PRIMARY KEY (owner, start_date)
+);
+CREATE TABLE IF NOT EXISTS connections (
+    display_name TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    synced_at TEXT NOT NULL
+);
+"""
+
+# recomputes the rollups of the given days of an owner from the stored payloads
+_UPDATE_DAILY_LOAD = """
+INSERT OR REPLACE INTO daily_load
+SELECT
+    owner,
+    substr(start_time_local, 1, 10) AS day,
+    count(*),
+    total(json_extract(payload, '$.duration')),
+    total(json_extract(payload, '$.distance')),
+    total(json_extract(payload, '$.activityTrainingLoad')),
+    total(json_extract(payload, '$.hrTimeInZone_1')),
+    total(json_extract(payload, '$.hrTimeInZone_2')),
+    total(json_extract(payload, '$.hrTimeInZone_3')),
+    total(json_extract(payload, '$.hrTimeInZone_4')),
+    total(json_extract(payload, '$.hrTimeInZone_5'))
+FROM activities
+WHERE owner = ? AND substr(start_time_local, 1, 10) IN (SELECT value FROM json_each(?))
+GROUP BY owner, day
+"""
+
+# bumps the version of the given days of an owner
+_UPDATE_DAILY_VERSION = """
+INSERT INTO daily_version (owner, day, version)
+SELECT ?, value, 1 FROM json_each(?) WHERE true
+ON CONFLICT (owner, day) DO UPDATE SET version = version + 1
+"""
+
+
+@dataclass(frozen=True)
+class DailyLoad:
+    day: date
+    activities: int
+    duration: float
+    distance: float
+    training_load: float
+    hr_time_in_zones: tuple[float, float, float, float, float]
+
+
+@dataclass(frozen=True)
+class SyncState:
+    newest: str  # start_time_local of the newest stored activity, as sent by Garmin
+    covered_from: date  # every activity since this day is stored
+    synced_at: datetime
+    # older ranges stored apart from the ones since covered_from, only synced once they were final
+    ranges: tuple[tuple[date, date], ...] = ()
+
+
+@dataclass(frozen=True)
+class StoredConnections:
+    connections: list[Connection]
+    synced_at: datetime
+
+
+class ActivityStore:
+    """
+    SQLite backed store of raw activity list payloads, keyed by activity id and owner display name.
+    Payloads are kept as sent by Garmin so they can be parsed with ActivityListItem.from_dict when read back.
+    """
+
+    def __init__(self, path: str = ".garminconnect/activities.sqlite3"):
+        self.path = path
+        # shared by every worker of the app, so writers wait for each other instead of failing right away
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        # readers of other processes don't block the writer
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        if not self._db.execute("SELECT 1 FROM daily_load LIMIT 1").fetchone():
+            # stores created before the rollups existed
+            self._rebuild_daily_loads()
+
+    def close(self):
+        self._db.close()
+
+    def upsert(self, owner: str, activities: list[dict]):
+        with self._db:
+            self._write(owner, activities, [])
+
+    def replace(self, owner: str, start_date: date, end_date: date, activities: list[dict]) -> int:
+        """
+        Make the given activities the stored ones of an owner between both days, inclusive.
+        Only the activities that are new, changed or gone are written, so the rollups and versions of the days whose
+        activities didn't change are left as they are.
+        :return: Number of activities written or deleted
+        """
+        payloads = {a["activityId"]: json.dumps(a) for a in activities}
+        with self._db:
+            stored = dict(
+                self._db.execute(
+                    "SELECT activity_id, payload FROM activities "
+                    "WHERE owner = ? AND start_time_local >= ? AND substr(start_time_local, 1, 10) <= ?",
+                    (owner, start_date.isoformat(), end_date.isoformat()),
+                )
+            )
+            changed = [a for a in activities if stored.get(a["activityId"]) != payloads[a["activityId"]]]
+            gone = [i for i in stored if i not in payloads]
+            self._write(owner, changed, gone)
+        return len(changed) + len(gone)
+
+    def _write(self, owner: str, activities: list[dict], gone: list[int]):
+        # the days the activities were on before are updated too, as their start time can change
+        ids = json.dumps([a["activityId"] for a in activities] + gone)
+        days = {a["startTimeLocal"][:10] for a in activities}
+        days.update(
+            day
+            for (day,) in self._db.execute(
+                "SELECT substr(start_time_local, 1, 10) FROM activities "
+                "WHERE owner = ? AND activity_id IN (SELECT value FROM json_each(?))",
+                (owner, ids),
+            )
+        )
+        self._db.executemany("DELETE FROM activities WHERE owner = ? AND activity_id = ?", [(owner, i) for i in gone])
+        self._db.executemany(
+            "INSERT OR REPLACE INTO activities (owner, activity_id, start_time_local, payload) VALUES (?, ?, ?, ?)",
+            [(owner, a["activityId"], a["startTimeLocal"], json.dumps(a)) for a in activities],
+        )
+        # only the rollups of the days that changed are updated, days left without activities are dropped
+        days_json = json.dumps(sorted(days))
+        self._db.execute(
+            "DELETE FROM daily_load WHERE owner = ? AND day IN (SELECT value FROM json_each(?))", (owner, days_json)
+        )
+        self._db.execute(_UPDATE_DAILY_LOAD, (owner, days_json))
+        self._db.execute(_UPDATE_DAILY_VERSION, (owner, days_json))
+
+    def get_activities(self, owner: str, start_date: date, end_date: date) -> list[ActivityListItem]:
+        rows = self._db.execute(
+            "SELECT payload FROM activities WHERE owner = ? AND start_time_local >= ? AND start_time_local < ? "
+            "ORDER BY start_time_local DESC",
+            (owner, start_date.isoformat(), (end_date + timedelta(days=1)).isoformat()),
+        )
+        return [ActivityListItem.from_dict(json.loads(payload)) for (payload,) in rows]
+
+    def get_version(self, owner: str, start_date: date, end_date: date) -> int:
+        """
+        :return: A number that grows each time the activities of an owner between both days, inclusive, change
+        """
+        row = self._db.execute(
+            "SELECT coalesce(sum(version), 0) FROM daily_version WHERE owner = ? AND day >= ? AND day <= ?",
+            (owner, start_date.isoformat(), end_date.isoformat()),
+        ).fetchone()
+        return row[0]
+
+    def get_daily_loads(self, owner: str, start_date: date, end_date: date) -> list[DailyLoad]:
+        """
+        :return: The training rollups of each day with activities between both days, inclusive
+        """
+        rows = self._db.execute(
+            "SELECT day, activities, duration, distance, training_load, hr_time_in_zone_1, hr_time_in_zone_2, "
+            "hr_time_in_zone_3, hr_time_in_zone_4, hr_time_in_zone_5 FROM daily_load "
+            "WHERE owner = ? AND day >= ? AND day <= ? ORDER BY day",
+            (owner, start_date.isoformat(), end_date.isoformat()),
+        )
+        return [
+            DailyLoad(
+                day=date.fromisoformat(day),
+                activities=activities,
+                duration=duration,
+                distance=distance,
+                training_load=training_load,
+                hr_time_in_zones=tuple(zones),
+            )
+            for day, activities, duration, distance, training_load, *zones in rows
+        ]
+
+    def get_sync_state(self, owner: str) -> SyncState | None:
+        row = self._db.execute(
+            "SELECT newest, covered_from, synced_at FROM sync_state WHERE owner = ?",
+            (owner,),
+        ).fetchone()
+        if not row:
+            return None
+        ranges = self._db.execute(
+            "SELECT start_date, end_date FROM synced_ranges WHERE owner = ? ORDER BY start_date",
+            (owner,),
+        )
+        return SyncState(
+            newest=row[0],
+            covered_from=date.fromisoformat(row[1]),
+            synced_at=datetime.fromisoformat(row[2]),
+            ranges=tuple((date.fromisoformat(start), date.fromisoformat(end)) for start, end in ranges),
+        )
+
+    def set_sync_state(self, owner: str, state: SyncState):
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sync_state (owner, newest, covered_from, synced_at) VALUES (?, ?, ?, ?)",
+                (owner, state.newest, state.covered_from.isoformat(), state.synced_at.isoformat()),
+            )
+            self._db.execute("DELETE FROM synced_ranges WHERE owner = ?", (owner,))
+            self._db.executemany(
+                "INSERT INTO synced_ranges (owner, start_date, end_date) VALUES (?, ?, ?)",
+                [(owner, start.isoformat(), end.isoformat()) for start, end in state.ranges],
+            )
+
+    def get_connections(self) -> StoredConnections | None:
+        """
+        :return: The connections of the user as they were the last time they were fetched, None if they never were
+        """
+        rows = self._db.execute("SELECT payload, synced_at FROM connections ORDER BY rowid").fetchall()
+        if not rows:
+            return None
+        return StoredConnections(
+            connections=[Connection(**json.loads(payload)) for payload, _ in rows],
+            synced_at=min(datetime.fromisoformat(synced_at) for _, synced_at in rows),
+        )
+
+    def set_connections(self, connections: list[Connection], synced_at: datetime):
+        with self._db:
+            self._db.execute("DELETE FROM connections")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO connections (display_name, payload, synced_at) VALUES (?, ?, ?)",
+                [(c.display_name, json.dumps(asdict(c)), synced_at.isoformat()) for c in connections],
+            )
+
+    def _rebuild_daily_loads(self):
+        owners = self._db.execute("SELECT DISTINCT owner FROM activities").fetchall()
+        with self._db:
+            for (owner,) in owners:
+                days = self._db.execute(
+                    "SELECT DISTINCT substr(start_time_local, 1, 10) FROM activities WHERE owner = ?",
+                    (owner,),
+                ).fetchall()
+                self._db.execute(_UPDATE_DAILY_LOAD, (owner, json.dumps([d for (d,) in days])))
+        logger.info(f"rebuilt training load rollups of {len(owners)} owners")
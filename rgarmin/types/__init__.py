@@ -10,3 +10,4 @@ from .settings import (
 )
 from .activity import ActivityListItem as ActivityListItem, ActivityType as ActivityType, Activity as Activity
 from .connection import Connection as Connection
+from ._encoder import to_jsonable as to_jsonable, to_json as to_json
@@ -0,0 +1,66 @@
+import logging
+from collections.abc import Callable
+from dataclasses import fields
+from typing import Any
+
+from pyutils.dicts import camel_to_snake_dict
+
+logger = logging.getLogger(__name__)
+
+_IGNORED = ""
+
+
+class Decoder:
+    """
+    Precompiled decoder turning Garmin payloads into the keyword arguments of a dataclass in a single pass.
+    Payload keys can be either camelCase, as sent by Garmin, or snake_case. Each key is resolved to its field only the
+    first time it is seen, so decoding an item is just a few dict lookups per key.
+    """
+
+    def __init__(
+        self,
+        cls: type,
+        converters: dict[str, Callable[[Any], Any]] | None = None,
+        rename: Callable[[str], str] | None = None,
+    ):
+        """
+        :param cls: Dataclass to decode
+        :param converters: (Optional) Functions applied to the value of each field, nested dicts and lists are only
+            converted to snake_case by default
+        :param rename: (Optional) Maps snake_case keys to field names for the keys that don't match them directly
+        """
+        self.cls = cls
+        self.fields = frozenset(f.name for f in fields(cls))
+        self.converters = converters or {}
+        self.rename = rename
+        self._keys: dict[str, str] = {}
+
+    def __call__(self, data: dict) -> Any:
+        return self.cls(**self.decode(data))
+
+    def decode(self, data: dict) -> dict[str, Any]:
+        kwargs = {}
+        for key, value in data.items():
+            name = self._keys.get(key)
+            if name is None:
+                name = self._resolve(key)
+            if name == _IGNORED:
+                continue
+
+            converter = self.converters.get(name)
+            if converter is not None:
+                value = converter(value)
+            elif isinstance(value, dict | list):
+                value = camel_to_snake_dict(value)
+            kwargs[name] = value
+        return kwargs
+
+    def _resolve(self, key: str) -> str:
+        name = key if key in self.fields else next(iter(camel_to_snake_dict({key: None})))
+        if self.rename is not None and name not in self.fields:
+            name = self.rename(name)
+        if name not in self.fields:
+            logger.debug(f"ignoring key {key} of {self.cls.__name__}")
+            name = _IGNORED
+        self._keys[key] = name
+        return name
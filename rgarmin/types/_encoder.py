@@ -0,0 +1,96 @@
+import json
+import logging
+import math
+from collections.abc import Callable
+from dataclasses import fields, is_dataclass
+from datetime import date, datetime
+from types import UnionType
+from typing import Any, Union, get_args, get_origin
+
+logger = logging.getLogger(__name__)
+
+_PLAIN_TYPES = (str, int, float, bool)
+
+_encoders: dict[type, Callable[[Any, bool], dict[str, Any]]] = {}
+
+
+class Encoder:
+    """
+    Serializer of a dataclass generated once from its fields.
+    The generated function reads each field directly and only converts the ones that need it (dates, nested dataclasses
+    and containers), instead of inspecting every object on every call like jsonable_encoder does. Creating an Encoder
+    registers it, so to_jsonable uses it for every instance of the class.
+    """
+
+    def __init__(self, cls: type):
+        self.cls = cls
+        self._encode = _compile(cls)
+        _encoders[cls] = self._encode
+
+    def __call__(self, obj: Any, omit_none: bool = False) -> dict[str, Any]:
+        return self._encode(obj, omit_none)
+
+
+def to_jsonable(value: Any, omit_none: bool = False) -> Any:
+    """
+    JSON compatible copy of a value made of rgarmin.types dataclasses, dicts, lists and dates.
+    Non finite floats (NaN and infinities have no JSON representation) are encoded as None.
+    :param value: Value to encode
+    :param omit_none: Drop the dataclass fields that are None
+    """
+    if value is None or isinstance(value, _PLAIN_TYPES):
+        return value if type(value) is not float or math.isfinite(value) else None
+
+    encode = _encoders.get(type(value))
+    if encode is None and is_dataclass(value) and not isinstance(value, type):
+        encode = Encoder(type(value))
+    if encode is not None:
+        return encode(value, omit_none)
+
+    if isinstance(value, datetime | date):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v, omit_none) for k, v in value.items()}
+    if isinstance(value, list | tuple | set):
+        return [to_jsonable(v, omit_none) for v in value]
+    raise TypeError(f"unsupported type {type(value).__name__}")
+
+
+def to_json(value: Any, omit_none: bool = False) -> bytes:
+    # anything non finite left is a bug, failing beats writing NaN, which JSON parsers reject
+    content = to_jsonable(value, omit_none)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _compile(cls: type) -> Callable[[Any, bool], dict[str, Any]]:
+    lines = ["def encode(obj, omit_none):", "    result = {}"]
+    for field in fields(cls):
+        expression = _expression(field.type)
+        lines += [
+            f"    value = obj.{field.name}",
+            "    if value is None:",
+            "        if not omit_none:",
+            f"            result[{field.name!r}] = None",
+            "    else:",
+            f"        result[{field.name!r}] = {expression}",
+        ]
+    lines.append("    return result")
+
+    namespace: dict[str, Any] = {"to_jsonable": to_jsonable, "isfinite": math.isfinite, "date": date}
+    exec("\n".join(lines), namespace)
+    logger.debug(f"compiled encoder for {cls.__name__}")
+    return namespace["encode"]
+
+
+def _expression(field_type: Any) -> str:
+    if get_origin(field_type) in (Union, UnionType):
+        args = [a for a in get_args(field_type) if a is not type(None)]
+        field_type = args[0] if len(args) == 1 else Any
+    # fields hold whatever the payload had, annotations only pick the fast path for the expected type
+    if field_type is float:
+        return "value if type(value) is not float or isfinite(value) else None"
+    if field_type in _PLAIN_TYPES:
+        return "value"
+    if field_type in (datetime, date):
+        return "value.isoformat() if isinstance(value, date) else to_jsonable(value, omit_none)"
+    return "to_jsonable(value, omit_none)"
@@ -1,13 +1,45 @@
 import logging
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from inspect import signature
 from typing import Any, override
 
+from rgarmin.types._decoder import Decoder
+from rgarmin.types._encoder import Encoder
+
 logger = logging.getLogger(__name__)
 
+SIMILAR_START_WINDOW = timedelta(minutes=1)  # max start time difference between two similar activities
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+_activity_types: dict[tuple, "ActivityType"] = {}  # interned activity types by their decoded fields
+
+
+def is_similar(a: Any, b: Any) -> bool:
+    """
+    Check if b looks like the same session as a, from their start_time_local, distance and duration.
+    Distance and duration are compared relative to the ones of a, so the check is not symmetric.
+    """
+    isSimilar = True
+
+    # activities started at a similar time
+    start_time = a.start_time_local - SIMILAR_START_WINDOW
+    end_time = a.start_time_local + SIMILAR_START_WINDOW
+    isSimilar &= start_time <= b.start_time_local <= end_time
+
+    # activities have similar distance
+    if a.distance and b.distance:
+        start_distance, end_distance = a.distance * 0.95, a.distance * 1.05
+        isSimilar &= start_distance <= b.distance <= end_distance
+
+    # activities have similar duration
+    if a.duration and b.duration:
+        start_duration, end_duration = a.duration * 0.95, a.duration * 1.05
+        isSimilar &= start_duration <= b.duration <= end_duration
+
+    return isSimilar
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class ActivityType:
     type_id: int
     type_key: str
@@ -18,11 +50,16 @@ class ActivityType:
 
     @classmethod
     def from_dict(cls, data: dict) -> "ActivityType":
-        valid_keys = set(signature(ActivityType).parameters.keys())
-        return cls(**{k: v for k, v in data.items() if k in valid_keys})
+        # there are only a few dozen types, so a single instance of each is shared by all the activities
+        kwargs = _activity_type_decoder.decode(data)
+        key = tuple(sorted(kwargs.items()))
+        activity_type = _activity_types.get(key)
+        if activity_type is None:
+            activity_type = _activity_types.setdefault(key, cls(**kwargs))
+        return activity_type
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ActivityListItem:
     activity_id: int
     activity_name: str
@@ -55,43 +92,21 @@ class ActivityListItem:
     active_sets: int | None = None
     max_speed: float | None = None
     avg_stride_length: float | None = None
-    similar_activities: list[int] = field(default_factory=list)
+    activity_training_load: float | None = None
 
     @override
     def __eq__(self, value: object, /) -> bool:
         assert isinstance(value, ActivityListItem), "Can only compare with another ActivityListItem"
-        isSimilar = True
-
-        # activities started at a similar time
-        start_time = self.start_time_local - timedelta(minutes=1)
-        end_time = self.start_time_local + timedelta(minutes=1)
-        isSimilar &= start_time <= value.start_time_local <= end_time
-
-        # activities have similar distance
-        if self.distance and value.distance:
-            start_distance, end_distance = self.distance * 0.95, self.distance * 1.05
-            isSimilar &= start_distance <= value.distance <= end_distance
-
-        # activities have similar duration
-        if self.duration and value.duration:
-            start_duration, end_duration = self.duration * 0.95, self.duration * 1.05
-            isSimilar &= start_duration <= value.duration <= end_duration
-
-        return isSimilar
+        return is_similar(self, value)
 
     @classmethod
     def from_dict(cls, data: dict) -> "ActivityListItem":
-        data["activity_type"] = ActivityType.from_dict(data["activity_type"])
-        data["start_time_local"] = datetime.fromisoformat(data["start_time_local"])
-        data["start_time_gmt"] = datetime.fromisoformat(data["start_time_gmt"])
-        data["weekday"] = data["start_time_local"].strftime("%A")
-
-        valid_keys = set(signature(ActivityListItem).parameters.keys())
-        logger.debug(f"ignoring keys: {set(data.keys()) - valid_keys}")
-        return cls(**{k: v for k, v in data.items() if k in valid_keys})
+        kwargs = _activity_list_item_decoder.decode(data)
+        kwargs["weekday"] = WEEKDAYS[kwargs["start_time_local"].weekday()]
+        return cls(**kwargs)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Summary:
     distance: float
     duration: float
@@ -148,12 +163,10 @@ class Summary:
 
     @classmethod
     def from_dict(cls, data: dict) -> "Summary":
-        valid_keys = set(signature(Summary).parameters.keys())
-        logger.debug(f"ignoring keys: {set(data.keys()) - valid_keys}")
-        return cls(**{k: v for k, v in data.items() if k in valid_keys})
+        return cls(**_summary_decoder.decode(data))
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Activity:
     activity_id: int
     activity_name: str
@@ -169,10 +182,26 @@ class Activity:
 
     @classmethod
     def from_dict(cls, data: dict) -> "Activity":
-        data = {k.replace("_dto", ""): v for k, v in data.items()}
-        data["activity_type"] = ActivityType.from_dict(data["activity_type"])
-        data["summary"] = Summary.from_dict(data["summary"])
-
-        valid_keys = set(signature(Activity).parameters.keys())
-        logger.debug(f"ignoring keys: {set(data.keys()) - valid_keys}")
-        return cls(**{k: v for k, v in data.items() if k in valid_keys})
+        return cls(**_activity_decoder.decode(data))
+
+
+_activity_type_decoder = Decoder(ActivityType)
+_activity_list_item_decoder = Decoder(
+    ActivityListItem,
+    converters={
+        "activity_type": ActivityType.from_dict,
+        "start_time_local": datetime.fromisoformat,
+        "start_time_gmt": datetime.fromisoformat,
+    },
+)
+_summary_decoder = Decoder(Summary)
+_activity_decoder = Decoder(
+    Activity,
+    converters={"activity_type": ActivityType.from_dict, "summary": Summary.from_dict},
+    rename=lambda k: k.replace("_dto", ""),
+)
+
+_activity_type_encoder = Encoder(ActivityType)
+_activity_list_item_encoder = Encoder(ActivityListItem)
+_summary_encoder = Encoder(Summary)
+_activity_encoder = Encoder(Activity)
@@ -1,6 +1,8 @@
 import logging
 from dataclasses import dataclass
-from inspect import signature
+
+from rgarmin.types._decoder import Decoder
+from rgarmin.types._encoder import Encoder
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +20,9 @@ class Connection:
 
     @classmethod
     def from_dict(cls, data: dict) -> "Connection":
-        valid_keys = set(signature(Connection).parameters.keys())
-        logger.debug(f"ignoring keys: {set(data.keys()) - valid_keys}")
-        return cls(**{k: v for k, v in data.items() if k in valid_keys})
+        return cls(**_connection_decoder.decode(data))
+
+
+_connection_decoder = Decoder(Connection)
+
+_connection_encoder = Encoder(Connection)
@@ -1,6 +1,8 @@
 import logging
 from dataclasses import dataclass
-from inspect import signature
+
+from rgarmin.types._decoder import Decoder
+from rgarmin.types._encoder import Encoder
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +24,9 @@ class UserProfile:
 
     @classmethod
     def from_dict(cls, data: dict) -> "UserProfile":
-        valid_keys = set(signature(UserProfile).parameters.keys())
-        logger.debug(f"ignoring keys: {set(data.keys()) - valid_keys}")
-        return cls(**{k: v for k, v in data.items() if k in valid_keys})
+        return cls(**_user_profile_decoder.decode(data))
+
+
+_user_profile_decoder = Decoder(UserProfile)
+
+_user_profile_encoder = Encoder(UserProfile)
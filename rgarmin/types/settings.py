@@ -1,11 +1,11 @@
 import logging
 from dataclasses import dataclass
 from datetime import date
-from inspect import signature
 
 from garth import http
 
-from pyutils.dicts import camel_to_snake_dict
+from rgarmin.types._decoder import Decoder
+from rgarmin.types._encoder import Encoder
 
 logger = logging.getLogger(__name__)
 
@@ -76,15 +76,7 @@ class UserData:
 
     @classmethod
     def from_dict(cls, data: dict) -> "UserData":
-        data["power_format"] = PowerFormat(**data["power_format"])
-        data["heart_rate_format"] = PowerFormat(**data["heart_rate_format"])
-        data["first_day_of_week"] = FirstDayOfWeek(**data["first_day_of_week"])
-        data["weather_location"] = WeatherLocation(**data["weather_location"])
-        data["birth_date"] = date.fromisoformat(data["birth_date"])
-
-        valid_keys = set(signature(UserData).parameters.keys())
-        logger.debug(f"ignoring keys: {set(data.keys()) - valid_keys}")
-        return cls(**{k: v for k, v in data.items() if k in valid_keys})
+        return cls(**_user_data_decoder.decode(data))
 
 
 @dataclass(frozen=True)
@@ -108,10 +100,33 @@ class UserSettings:
         client = client or http.client
         settings = client.connectapi("/userprofile-service/userprofile/user-settings")
         assert isinstance(settings, dict)
-        return cls.from_dict(camel_to_snake_dict(settings))
+        return cls.from_dict(settings)
 
     @classmethod
     def from_dict(cls, data: dict) -> "UserSettings":
-        data["user_data"] = UserData.from_dict(data["user_data"])
-        data["user_sleep"] = UserSleep(**data["user_sleep"])
-        return cls(**data)
+        return cls(**_user_settings_decoder.decode(data))
+
+
+_power_format_decoder = Decoder(PowerFormat)
+_weather_location_decoder = Decoder(WeatherLocation)
+_user_data_decoder = Decoder(
+    UserData,
+    converters={
+        "power_format": _power_format_decoder,
+        "heart_rate_format": _power_format_decoder,
+        "first_day_of_week": Decoder(FirstDayOfWeek),
+        "weather_location": lambda v: v and _weather_location_decoder(v),
+        "birth_date": date.fromisoformat,
+    },
+)
+_user_settings_decoder = Decoder(
+    UserSettings,
+    converters={"user_data": UserData.from_dict, "user_sleep": Decoder(UserSleep)},
+)
+
+_power_format_encoder = Encoder(PowerFormat)
+_first_day_of_week_encoder = Encoder(FirstDayOfWeek)
+_weather_location_encoder = Encoder(WeatherLocation)
+_user_data_encoder = Encoder(UserData)
+_user_sleep_encoder = Encoder(UserSleep)
+_user_settings_encoder = Encoder(UserSettings)
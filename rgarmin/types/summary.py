@@ -1,11 +1,13 @@
 import logging
 from dataclasses import dataclass
-from inspect import signature
+
+from rgarmin.types._decoder import Decoder
+from rgarmin.types._encoder import Encoder
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(slots=True)
 class DailySummary:
     user_profile_id: int
     total_kilocalories: float
@@ -100,6 +102,9 @@ class DailySummary:
 
     @classmethod
     def from_dict(cls, data: dict) -> "DailySummary":
-        valid_keys = set(signature(DailySummary).parameters.keys())
-        logger.debug(f"ignoring keys: {set(data.keys()) - valid_keys}")
-        return cls(**{k: v for k, v in data.items() if k in valid_keys})
+        return cls(**_daily_summary_decoder.decode(data))
+
+
+_daily_summary_decoder = Decoder(DailySummary)
+
+_daily_summary_encoder = Encoder(DailySummary)
@@ -1,19 +1,47 @@
-function onActivityHoverIn(similar_activities) {
-    for (var id of similar_activities) {
-        var activity = document.getElementById(id);
-        activity.classList.add("bg-yellow-500");
-        activity.classList.add("hover:bg-gray-700");
+function sessionActivities(activity) {
+    if (!activity.dataset.group) {
+        return [];
     }
+    return [...document.querySelectorAll(`[data-group="${activity.dataset.group}"]`)].filter((a) => a !== activity);
 }
 
-function onActivityHoverOut(similar_activities) {
-    for (var id of similar_activities) {
-        var activity = document.getElementById(id);
-        activity.classList.remove("bg-yellow-500");
-        activity.classList.remove("hover:bg-gray-700");
+function onActivityHoverIn(activity) {
+    for (var similar of sessionActivities(activity)) {
+        similar.classList.add("bg-yellow-500");
+        similar.classList.add("hover:bg-gray-700");
+    }
+}
+
+function onActivityHoverOut(activity) {
+    for (var similar of sessionActivities(activity)) {
+        similar.classList.remove("bg-yellow-500");
+        similar.classList.remove("hover:bg-gray-700");
     }
 }
 
 function openActivityPage(activity_id) {
     window.open(`https://connect.garmin.com/modern/activity/${activity_id}`, "_blank");
 }
+
+function insertActivities(templateId) {
+    // streamed activities are moved into their day keeping the start time order
+    var template = document.getElementById(templateId);
+    for (var activity of [...template.content.children]) {
+        var day = document.getElementById(`day-${activity.dataset.day}`);
+        var next = [...day.children].find((a) => a.dataset.start > activity.dataset.start);
+        day.insertBefore(activity, next ?? null);
+    }
+    template.remove();
+}
+
+function setActivityGroups(groups) {
+    for (var [activityId, group] of Object.entries(groups)) {
+        document.getElementById(activityId)?.setAttribute("data-group", group);
+    }
+}
+
+function insertErrors(templateId) {
+    var template = document.getElementById(templateId);
+    document.getElementById("activity-container").before(template.content);
+    template.remove();
+}